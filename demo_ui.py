@@ -1,5 +1,5 @@
 import gradio as gr
-import time
+import asyncio
 import re
 from src.engine.skill_engine import SkillEngine
 from src.config import GOOGLE_API_KEY
@@ -15,14 +15,14 @@ else:
     print("Warning: Google API Key not found.")
     engine = None
 
-def career_advisor(user_message):
+async def career_advisor(user_message):
     if not engine:
         yield "Error: System not initialized. Please check API Key configuration."
         return
 
     yield "*AI is analyzing skills and searching for courses... (this may take 5-10 seconds)*"
     try:
-        result = engine.analyze_and_recommend(user_message)
+        result = await engine.aanalyze_and_recommend(user_message)
         
         intent = result.get('user_intent', {})
         c_role = intent.get('detected_current_role', 'Unknown')
@@ -70,7 +70,7 @@ def career_advisor(user_message):
         chunk_size = 50 
         for i in range(0, len(output_text), chunk_size):
             yield output_text[:i+chunk_size]
-            time.sleep(0.01) 
+            await asyncio.sleep(0.01)
             
         yield output_text
 
@@ -88,4 +88,8 @@ iface = gr.Interface(
 )
 
 if __name__ == "__main__":
-    iface.launch(theme=gr.themes.Soft())
+    try:
+        iface.launch(theme=gr.themes.Soft())
+    finally:
+        if engine:
+            engine.close()
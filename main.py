@@ -98,6 +98,8 @@ def main():
         except Exception as e:
             print(f"Error processing request: {e}")
 
+    engine.close()
+
 
 if __name__ == "__main__":
     main()
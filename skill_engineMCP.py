@@ -34,7 +34,7 @@ except Exception as e:
     engine = None
 
 @mcp.tool()
-def get_career_advice(user_query: str) -> str:
+async def get_career_advice(user_query: str) -> str:
     """
     *** CRITICAL INSTRUCTION FOR AI MODEL ***
     You are a DATA REPORTER. You are NOT an editor.
@@ -54,7 +54,7 @@ def get_career_advice(user_query: str) -> str:
         return "System Error: SkillEngine is not initialized. Please check server logs and API Key."
 
     try:   
-        result = engine.analyze_and_recommend(user_query)
+        result = await engine.aanalyze_and_recommend(user_query)
         
         intent = result.get('user_intent', {})
         c_role = intent.get('detected_current_role', 'Unknown')
@@ -117,4 +117,8 @@ def get_career_advice(user_query: str) -> str:
         return f"System Error: An unexpected error occurred in the Career Tool. Details: {str(e)}"
 
 if __name__ == "__main__":
-    mcp.run()
+    try:
+        mcp.run()
+    finally:
+        if engine:
+            engine.close()
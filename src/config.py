@@ -22,6 +22,103 @@ URL_COURSERA_API = os.getenv("URL_COURSERA_API")
 # Model Config
 MODEL_NAME = "gemini-2.5-flash"
 EMBEDDING_MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+# "torch", "onnx" or "onnx-int8" (ONNX Runtime, dynamically quantized); ONNX graphs are
+# exported to ONNX_MODEL_DIR on first use and checked against the PyTorch vectors
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+ONNX_MODEL_DIR = Path(os.getenv("ONNX_MODEL_DIR", BASE_DIR / "models"))
+EMBEDDING_BACKEND_MIN_COSINE = float(os.getenv("EMBEDDING_BACKEND_MIN_COSINE", "0.99"))
+
+# Ingestion Config
+# CSV rows read per chunk; ingestion streams chunks so memory does not grow with the catalog
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "2000"))
+# Processes embedding the catalog in parallel (0 = half the CPU cores, fewer if free
+# memory cannot hold a model copy per worker; 1 = in-process)
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "0"))
+# Memory each worker process takes for its own model copy and runtime, in MB
+EMBEDDING_WORKER_MEMORY_MB = int(os.getenv("EMBEDDING_WORKER_MEMORY_MB", "1024"))
+# Upsert batches are sized from measured throughput to take about this many seconds
+EMBEDDING_BATCH_SECONDS = float(os.getenv("EMBEDDING_BATCH_SECONDS", "30"))
+# Catalog vectors keyed by (content hash, model), kept outside the vector store so ID
+# changes and full rebuilds reuse them (empty string disables)
+DOCUMENT_EMBEDDING_CACHE_PATH = os.getenv(
+    "DOCUMENT_EMBEDDING_CACHE_PATH", str(BASE_DIR / "embedding_cache.sqlite")
+)
+
+# Pipeline Config
+# Fetchers share pooled keep-alive HTTP sessions; seconds per request and connections per pool
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+# Requests per host go through a shared token bucket: each fetcher sets a starting rate,
+# each window of healthy responses raises it by this fraction of that rate (up to MAX_FACTOR
+# times it) and each burst of 429/5xx responses halves it once, honouring Retry-After;
+# throttled requests are retried
+HTTP_RATE_INCREASE = float(os.getenv("HTTP_RATE_INCREASE", "0.05"))
+HTTP_RATE_MAX_FACTOR = float(os.getenv("HTTP_RATE_MAX_FACTOR", "4"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+# Paginated crawls save each page and the next cursor here, so a failed crawl resumes where
+# it stopped (empty string disables); checkpoints older than MAX_AGE seconds start over
+CRAWL_CHECKPOINT_PATH = os.getenv(
+    "CRAWL_CHECKPOINT_PATH", str(BASE_DIR / "crawl_checkpoints.sqlite")
+)
+CRAWL_CHECKPOINT_MAX_AGE = float(os.getenv("CRAWL_CHECKPOINT_MAX_AGE", "86400"))
+# update_pipeline crawls the sources in parallel threads (each keeps its own pacing)
+# instead of one after another
+PIPELINE_CONCURRENT = os.getenv("PIPELINE_CONCURRENT", "true").lower() == "true"
+
+# Retrieval Config
+# Number of threads used to search and rank missing skills in parallel (1 = sequential batch)
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "1"))
+# Start course search for each missing skill while the LLM is still streaming its JSON
+STREAM_ANALYSIS = os.getenv("STREAM_ANALYSIS", "false").lower() == "true"
+# Push free/Thai preference filters into the vector query (needs ranking flags in the store)
+FILTERED_SEARCH = os.getenv("FILTERED_SEARCH", "true").lower() == "true"
+# Initial neighbours per term for a filtered query; doubled while a bucket runs short
+FILTERED_SEARCH_K = int(os.getenv("FILTERED_SEARCH_K", "5"))
+FILTERED_SEARCH_MAX_K = int(os.getenv("FILTERED_SEARCH_MAX_K", "50"))
+# "chroma" queries the Chroma collection; "flat" memory-maps the exported matrix (exact search)
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "chroma").lower()
+# vector_manager exports the flat matrix after each update (by default only with the flat
+# backend). "float16" or "int8" adds a compact copy that is scanned first; its top
+# candidates are re-scored from float32 rows read on demand. This cuts the memory and
+# bandwidth of the scan only; it has no effect on the Chroma backend
+FLAT_INDEX_EXPORT = (
+    os.getenv("FLAT_INDEX_EXPORT", str(RETRIEVAL_BACKEND == "flat")).lower() == "true"
+)
+FLAT_INDEX_DTYPE = os.getenv("FLAT_INDEX_DTYPE", "float32")
+# First-pass candidates per requested neighbour re-scored at full precision
+FLAT_INDEX_RERANK_FACTOR = int(os.getenv("FLAT_INDEX_RERANK_FACTOR", "4"))
+# Fuse BM25 keyword hits into the vector results (reciprocal rank fusion) when the
+# lexical index built by vector_manager is present
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+LEXICAL_SEARCH_K = int(os.getenv("LEXICAL_SEARCH_K", "10"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Cache Config
+# In-memory LRU size for query embeddings; set EMBEDDING_CACHE_PATH to persist them on disk
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH")
+# LLM analysis cache: max entries (0 disables) and time-to-live in seconds
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "1024"))
+ANALYSIS_CACHE_TTL = float(os.getenv("ANALYSIS_CACHE_TTL", "86400"))
+# Ranked courses cached per (search terms, language, free preference, index version)
+RECOMMENDATION_CACHE_SIZE = int(os.getenv("RECOMMENDATION_CACHE_SIZE", "4096"))
+# Optional cosine similarity (e.g. 0.95) above which a first-turn message reuses a cached analysis
+ANALYSIS_CACHE_SIMILARITY = (
+    float(os.getenv("ANALYSIS_CACHE_SIMILARITY"))
+    if os.getenv("ANALYSIS_CACHE_SIMILARITY")
+    else None
+)
+
+# Session Config
+# "memory" (per process) or "sqlite" (survives restarts, shared by workers on one host)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_DB_PATH = Path(os.getenv("SESSION_DB_PATH", BASE_DIR / "sessions.sqlite"))
+# 0 disables a limit
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "86400"))
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "20"))
+# Turns sent to the LLM verbatim; older turns are folded into a compact state (0 = send all)
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "3"))
 
 if not GOOGLE_API_KEY:
     # We might not want to raise immediately on import in case we are just running utilities,
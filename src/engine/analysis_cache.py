@@ -0,0 +1,116 @@
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import BaseMessage
+
+from src.engine.embedding_cache import normalize_term
+from src.utils.cache import LRUCache
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def history_digest(messages: Sequence[BaseMessage]) -> str:
+    """Digest of a session history; empty string for a first turn."""
+    if not messages:
+        return ""
+    hasher = hashlib.sha256()
+    for message in messages:
+        hasher.update(message.type.encode("utf-8"))
+        hasher.update(b"\x00")
+        hasher.update(str(message.content).encode("utf-8"))
+        hasher.update(b"\x01")
+    return hasher.hexdigest()
+
+
+class AnalysisCache:
+    """Cache of LLM analysis JSON keyed on (normalized message, history digest, model).
+
+    Exact hits come from a TTL + size bounded LRU. When similarity_threshold is set,
+    first-turn messages (empty history) can also be served by the cached analysis of
+    the most similar earlier first-turn message, measured by cosine similarity.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: Optional[float] = 86400,
+        similarity_threshold: Optional[float] = None,
+        embeddings: Optional[Embeddings] = None,
+    ):
+        self.entries = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.similarity_threshold = similarity_threshold if embeddings else None
+        self.embeddings = embeddings
+        self.similar_hits = 0
+        # First-turn key -> unit vector of its message, for near-duplicate lookups
+        self._first_turn_vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def make_key(
+        self, user_message: str, history: Sequence[BaseMessage], model_name: str
+    ) -> str:
+        raw = "\x00".join(
+            [normalize_term(user_message), history_digest(history), model_name]
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _embed(self, user_message: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(user_message), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(
+        self, key: str, user_message: str, first_turn: bool
+    ) -> Optional[Dict[str, Any]]:
+        value = self.entries.get(key)
+        if value is not None:
+            return copy.deepcopy(value)
+
+        if not (first_turn and self.similarity_threshold):
+            return None
+
+        with self._lock:
+            keys = list(self._first_turn_vectors.keys())
+            if not keys:
+                return None
+            matrix = np.stack(list(self._first_turn_vectors.values()))
+
+        similarities = matrix @ self._embed(user_message)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            return None
+
+        value = self.entries.get(keys[best])
+        if value is None:
+            # Entry expired or was evicted; drop its vector as well
+            with self._lock:
+                self._first_turn_vectors.pop(keys[best], None)
+            return None
+
+        self.similar_hits += 1
+        logger.debug(f"Analysis cache near-duplicate hit ({similarities[best]:.3f})")
+        return copy.deepcopy(value)
+
+    def set(
+        self, key: str, user_message: str, first_turn: bool, value: Dict[str, Any]
+    ) -> None:
+        self.entries.set(key, copy.deepcopy(value))
+        if not (first_turn and self.similarity_threshold):
+            return
+
+        vector = self._embed(user_message)
+        with self._lock:
+            self._first_turn_vectors[key] = vector
+            self._first_turn_vectors.move_to_end(key)
+            while len(self._first_turn_vectors) > self.entries.maxsize:
+                self._first_turn_vectors.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        stats = self.entries.stats()
+        stats["similar_hits"] = self.similar_hits
+        return stats
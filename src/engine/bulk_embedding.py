@@ -0,0 +1,179 @@
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from src.config import (
+    EMBEDDING_BACKEND,
+    EMBEDDING_BATCH_SECONDS,
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_WORKER_MEMORY_MB,
+    EMBEDDING_WORKERS,
+)
+from src.engine.embedding_backend import get_embedding_model
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Texts per shard handed to a worker; smaller jobs are embedded in-process
+MIN_SHARD_SIZE = 64
+# Shards per worker and batch, so a slow shard does not leave the others idle
+SHARDS_PER_WORKER = 4
+
+# Upsert batch bounds; the first batch measures throughput
+INITIAL_BATCH_SIZE = 512
+MIN_BATCH_SIZE = 64
+# Share of the currently available memory one batch may occupy
+BATCH_MEMORY_FRACTION = 0.25
+# Share of the available memory the default worker count may fill with model copies
+WORKER_MEMORY_FRACTION = 0.5
+WORKER_MEMORY_BYTES = EMBEDDING_WORKER_MEMORY_MB * 1024 * 1024
+# Python lists of floats cost ~32 bytes per dimension, plus text and metadata
+BYTES_PER_DIMENSION = 32
+BYTES_PER_ITEM_OVERHEAD = 4096
+
+# Model loaded once per worker process by the pool initializer
+_worker_model: Optional[Embeddings] = None
+
+
+def _init_worker(backend: str, model_name: str, threads: int) -> None:
+    global _worker_model
+    try:
+        import torch
+
+        # Workers split the cores instead of each spinning up a full thread pool
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker_model = get_embedding_model(backend, model_name)
+
+
+def _embed_shard(texts: List[str]) -> List[List[float]]:
+    return _worker_model.embed_documents(texts)
+
+
+def available_memory() -> Optional[int]:
+    """Bytes of physical memory currently free, or None where sysconf lacks it."""
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def default_workers() -> int:
+    """Half the CPU cores, capped by how many model copies fit in free memory."""
+    workers = max(1, (os.cpu_count() or 1) // 2)
+    memory = available_memory()
+    if memory:
+        workers = min(workers, int(memory * WORKER_MEMORY_FRACTION // WORKER_MEMORY_BYTES))
+    return max(1, workers)
+
+
+def max_upsert_batch(db: Any) -> Optional[int]:
+    """Largest batch the Chroma client accepts in one write, if it reports one."""
+    client = getattr(db._collection, "_client", None)
+    try:
+        if hasattr(client, "get_max_batch_size"):
+            return int(client.get_max_batch_size())
+        if hasattr(client, "max_batch_size"):
+            return int(client.max_batch_size)
+    except Exception as e:
+        logger.debug(f"Could not read Chroma max batch size: {e}")
+    return None
+
+
+def tune_batch_size(
+    items_per_second: float,
+    dimension: int,
+    avg_text_bytes: float,
+    upsert_limit: Optional[int] = None,
+    reserved_bytes: int = 0,
+) -> int:
+    """Batch that takes about EMBEDDING_BATCH_SECONDS and fits the memory budget.
+
+    reserved_bytes is memory about to be taken elsewhere (worker models not yet loaded).
+    """
+    size = int(items_per_second * EMBEDDING_BATCH_SECONDS)
+
+    memory = available_memory()
+    if memory:
+        memory = max(0, memory - reserved_bytes)
+        item_bytes = dimension * BYTES_PER_DIMENSION + 2 * avg_text_bytes + BYTES_PER_ITEM_OVERHEAD
+        size = min(size, int(memory * BATCH_MEMORY_FRACTION / item_bytes))
+    if upsert_limit:
+        size = min(size, upsert_limit)
+    return max(MIN_BATCH_SIZE, size)
+
+
+class BulkEmbedder:
+    """Embeds catalog text across worker processes that each load the model once.
+
+    Texts are cut into shards and mapped over the pool; results come back in input
+    order. Small jobs, or a single worker, use the in-process model instead.
+    """
+
+    def __init__(
+        self,
+        embedding_model: Embeddings,
+        workers: int = EMBEDDING_WORKERS,
+        backend: str = EMBEDDING_BACKEND,
+        model_name: str = EMBEDDING_MODEL_NAME,
+    ):
+        self.embedding_model = embedding_model
+        self.workers = workers if workers > 0 else default_workers()
+        self.backend = backend
+        self.model_name = model_name
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def pool_running(self) -> bool:
+        return self._executor is not None
+
+    @property
+    def pending_worker_memory(self) -> int:
+        """Bytes the worker processes will take for their models once the pool starts."""
+        if self.workers <= 1 or self.pool_running:
+            return 0
+        return self.workers * WORKER_MEMORY_BYTES
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            logger.info(f"Starting {self.workers} embedding worker processes...")
+            threads = max(1, (os.cpu_count() or 1) // self.workers)
+            # Spawned workers do not inherit the parent's torch/OpenMP thread state
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.backend, self.model_name, threads),
+            )
+        return self._executor
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        if self.workers <= 1 or len(texts) < 2 * MIN_SHARD_SIZE:
+            return self.embedding_model.embed_documents(texts)
+
+        shard_size = max(
+            MIN_SHARD_SIZE, math.ceil(len(texts) / (self.workers * SHARDS_PER_WORKER))
+        )
+        shards = [texts[i : i + shard_size] for i in range(0, len(texts), shard_size)]
+        # map keeps shard order, so vectors line up with the input texts
+        return [
+            vector
+            for shard_vectors in self._pool().map(_embed_shard, shards)
+            for vector in shard_vectors
+        ]
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self) -> "BulkEmbedder":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
@@ -0,0 +1,179 @@
+import argparse
+import math
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.config import DATA_DIR, INGEST_CHUNK_SIZE
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Every catalog field is text; a missing value is null rather than NaN or "nan"
+CATALOG_SCHEMA = pa.schema(
+    [
+        pa.field("id", pa.string()),
+        pa.field("title", pa.string()),
+        pa.field("description", pa.string()),
+        pa.field("level", pa.string()),
+        pa.field("duration", pa.string()),
+        pa.field("category", pa.string()),
+        pa.field("certificate_type", pa.string()),
+        pa.field("instructor", pa.string()),
+        pa.field("price", pa.string()),
+        pa.field("image_url", pa.string()),
+        pa.field("url", pa.string()),
+        pa.field("source", pa.string()),
+    ]
+)
+
+# Fields ingestion embeds or stores as metadata; other columns are never read
+INGEST_COLUMNS = [
+    "id", "title", "description", "level", "duration", "category",
+    "price", "image_url", "url", "source",
+]
+
+CATALOG_SUFFIX = ".parquet"
+LEGACY_SUFFIX = ".csv"
+
+# Rows per Parquet row group, so chunked reads decode one group at a time
+ROW_GROUP_SIZE = 10000
+COMPRESSION = "zstd"
+
+
+def _clean_value(value: Any) -> Optional[str]:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return str(value)
+
+
+def _to_table(records: Sequence[Dict[str, Any]]) -> pa.Table:
+    columns = {
+        field.name: pa.array(
+            [_clean_value(record.get(field.name)) for record in records], type=field.type
+        )
+        for field in CATALOG_SCHEMA
+    }
+    return pa.Table.from_pydict(columns, schema=CATALOG_SCHEMA)
+
+
+def _drop_nulls(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Absent keys fall back to the same defaults as columns a source never had
+    return [{key: value for key, value in row.items() if value is not None} for row in rows]
+
+
+def catalog_path(name: str, data_dir: Path = DATA_DIR) -> Path:
+    """Parquet file of a source; the legacy CSV if it has not been converted yet."""
+    path = data_dir / f"{name}{CATALOG_SUFFIX}"
+    legacy = path.with_suffix(LEGACY_SUFFIX)
+    if not path.exists() and legacy.exists():
+        return legacy
+    return path
+
+
+def write_catalog(records: Sequence[Dict[str, Any]], path: Union[str, Path]) -> int:
+    """Write records to a Parquet file with the catalog schema; returns rows written.
+
+    Keys outside the schema are dropped. The file is replaced atomically.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    table = _to_table(records)
+    tmp_path = path.with_name(path.name + ".tmp")
+    pq.write_table(table, tmp_path, compression=COMPRESSION, row_group_size=ROW_GROUP_SIZE)
+    os.replace(tmp_path, path)
+    return table.num_rows
+
+
+def save_catalog(records: Sequence[Dict[str, Any]], name: str, data_dir: Path = DATA_DIR) -> None:
+    """Save one source's records as data_dir/<name>.parquet."""
+    if not records:
+        logger.warning(f"No data to save for {name}")
+        return
+    path = data_dir / f"{name}{CATALOG_SUFFIX}"
+    rows = write_catalog(records, path)
+    logger.info(f"Saved {rows} records to: {path}")
+
+
+def _read_csv_chunks(
+    path: Path, columns: Optional[List[str]], chunk_size: int
+) -> Iterator[List[Dict[str, Any]]]:
+    # Read everything as text, as the Parquet schema does, instead of inferring types
+    wanted = set(columns or CATALOG_SCHEMA.names)
+    for df in pd.read_csv(
+        path,
+        chunksize=chunk_size,
+        dtype=str,
+        encoding="utf-8-sig",
+        usecols=lambda column: column in wanted,
+    ):
+        yield _drop_nulls(df.astype(object).where(df.notna(), None).to_dict("records"))
+
+
+def iter_catalog(
+    path: Union[str, Path],
+    columns: Optional[List[str]] = None,
+    chunk_size: int = INGEST_CHUNK_SIZE,
+) -> Iterator[List[Dict[str, Any]]]:
+    """Yield lists of up to chunk_size records, reading only the given columns.
+
+    Null fields are left out of the records. Legacy CSV files are read the same way.
+    """
+    path = Path(path)
+    if path.suffix == LEGACY_SUFFIX:
+        yield from _read_csv_chunks(path, columns, chunk_size)
+        return
+
+    parquet_file = pq.ParquetFile(path)
+    if columns is not None:
+        present = set(parquet_file.schema_arrow.names)
+        columns = [column for column in columns if column in present]
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+        yield _drop_nulls(batch.to_pylist())
+
+
+def convert_csv(csv_path: Path, remove_csv: bool = False) -> Path:
+    """Convert one CSV catalog to Parquet next to it, streaming CSV chunks."""
+    path = csv_path.with_suffix(CATALOG_SUFFIX)
+    tmp_path = path.with_name(path.name + ".tmp")
+    rows = 0
+    with pq.ParquetWriter(tmp_path, CATALOG_SCHEMA, compression=COMPRESSION) as writer:
+        for records in _read_csv_chunks(csv_path, None, ROW_GROUP_SIZE):
+            writer.write_table(_to_table(records))
+            rows += len(records)
+    os.replace(tmp_path, path)
+
+    logger.info(
+        f"Converted {csv_path.name} -> {path.name}: {rows} rows, "
+        f"{csv_path.stat().st_size / 1e6:.1f} MB -> {path.stat().st_size / 1e6:.1f} MB"
+    )
+    if remove_csv:
+        csv_path.unlink()
+    return path
+
+
+def convert_csv_catalogs(data_dir: Path = DATA_DIR, remove_csv: bool = False) -> List[Path]:
+    """One-shot conversion of every *.csv catalog in data_dir to Parquet."""
+    converted = []
+    for csv_path in sorted(data_dir.glob(f"*{LEGACY_SUFFIX}")):
+        try:
+            converted.append(convert_csv(csv_path, remove_csv))
+        except Exception as e:
+            logger.error(f"Error converting {csv_path.name}: {e}")
+    return converted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert the CSV course catalogs to Parquet."
+    )
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    parser.add_argument(
+        "--remove-csv", action="store_true", help="delete each CSV once converted"
+    )
+    args = parser.parse_args()
+    convert_csv_catalogs(args.data_dir, args.remove_csv)
@@ -0,0 +1,101 @@
+import re
+from typing import Any, Dict, Mapping, Sequence
+
+# Bump when the derived fields below change, so ingestion refreshes stored metadata
+ATTRIBUTES_VERSION = 1
+
+FREE_SOURCES = ("Khan Academy",)
+THAI_SOURCES = ("SkillLane", "FutureSkill")
+
+THAI_CHAR_PATTERN = re.compile(r"[\u0E00-\u0E7F]")
+HOURS_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*(?:h\b|hr|hour|ชั่วโมง)", re.IGNORECASE)
+MINUTES_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*(?:m\b|min|นาที)", re.IGNORECASE)
+
+# Ranking buckets, in the order the engine prefers them by default
+BUCKET_FREE = 0
+BUCKET_THAI = 1
+BUCKET_OTHER = 2
+
+
+# Vector-store "where" predicates selecting each bucket from the precomputed flags
+BUCKET_FILTERS: Dict[int, Dict[str, Any]] = {
+    BUCKET_FREE: {"is_free": True},
+    BUCKET_THAI: {"$and": [{"is_free": False}, {"is_thai": True}]},
+    BUCKET_OTHER: {"$and": [{"is_free": False}, {"is_thai": False}]},
+}
+
+
+def bucket_filter(buckets: Sequence[int]) -> Dict[str, Any]:
+    """Metadata predicate matching any of the given buckets."""
+    if len(buckets) == 1:
+        return BUCKET_FILTERS[buckets[0]]
+    return {"$or": [BUCKET_FILTERS[bucket] for bucket in buckets]}
+
+
+def is_thai_text(text: Any) -> bool:
+    """Check if text contains Thai characters."""
+    return bool(THAI_CHAR_PATTERN.search(str(text)))
+
+
+def clean_duration(raw: Any) -> str:
+    """Display form of a duration; missing values (NaN, empty) become "Self-paced"."""
+    duration = str(raw if raw is not None else "").strip()
+    if not duration or duration.lower() == "nan":
+        return "Self-paced"
+    return duration
+
+
+def parse_duration_minutes(raw: Any) -> int:
+    """Best-effort total minutes from strings like "4 hours", "1h 30m" or "45m"; 0 if unknown."""
+    duration = clean_duration(raw)
+    hours = HOURS_PATTERN.search(duration)
+    minutes = MINUTES_PATTERN.search(duration)
+    total = 0.0
+    if hours:
+        total += float(hours.group(1)) * 60
+    if minutes:
+        total += float(minutes.group(1))
+    return int(round(total))
+
+
+def compute_course_attributes(
+    source: Any, title: Any, price: Any, duration: Any
+) -> Dict[str, Any]:
+    """Typed ranking attributes stored as vector-store metadata at ingestion time."""
+    is_free = str(source) in FREE_SOURCES or "free" in str(price).lower()
+    is_thai = str(source) in THAI_SOURCES or is_thai_text(title)
+    return {
+        "is_free": is_free,
+        "is_thai": is_thai,
+        "duration_minutes": parse_duration_minutes(duration),
+        "lang": "th" if is_thai else "en",
+        "attributes_version": ATTRIBUTES_VERSION,
+    }
+
+
+def has_precomputed_attributes(metadata: Mapping[str, Any]) -> bool:
+    return "is_free" in metadata and "is_thai" in metadata
+
+
+def bucket_of(metadata: Mapping[str, Any]) -> int:
+    """Ranking bucket of a course; free wins over Thai, everything else is "other".
+
+    Reads the precomputed flags, falling back to computing them for stores
+    ingested before the flags existed.
+    """
+    if has_precomputed_attributes(metadata):
+        is_free, is_thai = bool(metadata["is_free"]), bool(metadata["is_thai"])
+    else:
+        attributes = compute_course_attributes(
+            metadata.get("source", ""),
+            metadata.get("title", ""),
+            metadata.get("price", "Unknown"),
+            metadata.get("duration", ""),
+        )
+        is_free, is_thai = attributes["is_free"], attributes["is_thai"]
+
+    if is_free:
+        return BUCKET_FREE
+    if is_thai:
+        return BUCKET_THAI
+    return BUCKET_OTHER
@@ -0,0 +1,172 @@
+import argparse
+import json
+import platform
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from src.config import (
+    EMBEDDING_BACKEND,
+    EMBEDDING_BACKEND_MIN_COSINE,
+    EMBEDDING_MODEL_NAME,
+    ONNX_MODEL_DIR,
+)
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# "torch" runs the Hugging Face model as is; the ONNX variants run an exported graph
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+ONNX_FILE = "onnx/model.onnx"
+CHECK_FILE = "backend_check.json"
+
+# Mixed EN/TH sample compared against the PyTorch vectors after an export
+CHECK_TEXTS = [
+    "Python for data analysis",
+    "SQL",
+    "Power BI dashboards for business intelligence",
+    "Figma UI/UX design fundamentals",
+    "Machine learning with scikit-learn",
+    "Digital marketing strategy",
+    "Title: Excel for beginners\nLevel: Beginner\nCategory: Business",
+    "การวิเคราะห์ข้อมูล",
+    "การตลาดดิจิทัล",
+    "เรียนเขียนโปรแกรมภาษาไพธอนสำหรับผู้เริ่มต้น",
+    "การออกแบบ UX/UI",
+    "ทักษะการสื่อสารและการนำเสนอ",
+]
+
+
+def _quantization_config() -> str:
+    """ONNX Runtime dynamic quantization preset for this CPU."""
+    machine = platform.machine().lower()
+    return "arm64" if machine in ("arm64", "aarch64") else "avx2"
+
+
+def onnx_model_dir(model_name: str = EMBEDDING_MODEL_NAME) -> Path:
+    return ONNX_MODEL_DIR / model_name.replace("/", "__")
+
+
+def onnx_file_name(backend: str) -> str:
+    if backend == "onnx-int8":
+        return f"onnx/model_qint8_{_quantization_config()}.onnx"
+    return ONNX_FILE
+
+
+def _load(backend: str, model_name: str) -> HuggingFaceEmbeddings:
+    if backend == "torch":
+        return HuggingFaceEmbeddings(model_name=model_name)
+    return HuggingFaceEmbeddings(
+        model_name=str(onnx_model_dir(model_name)),
+        model_kwargs={
+            "backend": "onnx",
+            "model_kwargs": {
+                "file_name": onnx_file_name(backend),
+                "provider": "CPUExecutionProvider",
+            },
+        },
+    )
+
+
+def export_onnx_model(backend: str, model_name: str = EMBEDDING_MODEL_NAME) -> Path:
+    """Export the model to ONNX (plus a dynamic int8 copy for "onnx-int8")."""
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    out_dir = onnx_model_dir(model_name)
+    if not (out_dir / ONNX_FILE).exists():
+        logger.info(f"Exporting {model_name} to ONNX at {out_dir}...")
+        # Loading with the onnx backend converts the checkpoint when no graph ships with it
+        SentenceTransformer(model_name, backend="onnx").save(str(out_dir))
+
+    if backend == "onnx-int8" and not (out_dir / onnx_file_name(backend)).exists():
+        logger.info(f"Quantizing ONNX graph ({_quantization_config()})...")
+        export_dynamic_quantized_onnx_model(
+            SentenceTransformer(str(out_dir), backend="onnx"),
+            quantization_config=_quantization_config(),
+            model_name_or_path=str(out_dir),
+        )
+    return out_dir
+
+
+def check_backend(
+    backend: str,
+    model_name: str = EMBEDDING_MODEL_NAME,
+    texts: Optional[List[str]] = None,
+) -> Dict[str, float]:
+    """Compare a backend's vectors with the PyTorch reference on sample texts.
+
+    Reports the lowest cosine similarity and the largest squared-L2 gap, the unit
+    of the engine's score threshold.
+    """
+    texts = texts or CHECK_TEXTS
+    reference = np.asarray(_load("torch", model_name).embed_documents(texts))
+    candidate = np.asarray(_load(backend, model_name).embed_documents(texts))
+
+    cosine = np.sum(reference * candidate, axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    )
+    return {
+        "min_cosine": float(cosine.min()),
+        "max_sq_l2": float(np.max(np.sum((reference - candidate) ** 2, axis=1))),
+    }
+
+
+def prepare_backend(backend: str, model_name: str = EMBEDDING_MODEL_NAME) -> None:
+    """Export the ONNX model if needed and verify it once against PyTorch."""
+    out_dir = export_onnx_model(backend, model_name)
+    check_path = out_dir / CHECK_FILE
+    checks: Dict[str, Dict[str, float]] = {}
+    if check_path.exists():
+        checks = json.loads(check_path.read_text(encoding="utf-8"))
+    file_name = onnx_file_name(backend)
+    if file_name in checks:
+        return
+
+    result = check_backend(backend, model_name)
+    logger.info(
+        f"{backend} vs torch: min cosine {result['min_cosine']:.5f}, "
+        f"max squared L2 {result['max_sq_l2']:.5f}"
+    )
+    if result["min_cosine"] < EMBEDDING_BACKEND_MIN_COSINE:
+        raise ValueError(
+            f"{backend} embeddings drift from PyTorch (min cosine "
+            f"{result['min_cosine']:.5f} < {EMBEDDING_BACKEND_MIN_COSINE})"
+        )
+    checks[file_name] = result
+    check_path.write_text(json.dumps(checks, indent=2), encoding="utf-8")
+
+
+def get_embedding_model(
+    backend: str = EMBEDDING_BACKEND, model_name: str = EMBEDDING_MODEL_NAME
+) -> Embeddings:
+    """Embedding model for queries and ingestion on the configured backend."""
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(
+            f"Unknown embedding backend '{backend}'. Choose one of {EMBEDDING_BACKENDS}."
+        )
+    if backend != "torch":
+        prepare_backend(backend, model_name)
+    return _load(backend, model_name)
+
+
+def embedding_fingerprint(
+    backend: str = EMBEDDING_BACKEND, model_name: str = EMBEDDING_MODEL_NAME
+) -> str:
+    """Model name plus backend, so cached vectors never mix backends."""
+    if backend == "torch":
+        return model_name
+    return f"{model_name}@{onnx_file_name(backend)}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export and verify an ONNX embedding backend."
+    )
+    parser.add_argument("--backend", choices=EMBEDDING_BACKENDS[1:], default="onnx-int8")
+    args = parser.parse_args()
+    prepare_backend(args.backend)
+    print(json.dumps(check_backend(args.backend), indent=2))
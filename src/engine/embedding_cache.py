@@ -0,0 +1,170 @@
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+
+from langchain_core.embeddings import Embeddings
+
+from src.utils.cache import LRUCache
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# Bumped when normalize_term changes, so on-disk entries from the old scheme are not reused
+TERM_KEY_VERSION = 2
+
+
+def normalize_term(text: str) -> str:
+    """Normalize a search term so trivially different spellings share a cache entry.
+
+    Only Unicode form and whitespace are normalized; case is kept because the
+    embedding model (and the LLM) treat "SQL" and "sql" differently.
+    """
+    text = unicodedata.normalize("NFC", str(text))
+    return " ".join(text.split())
+
+
+def model_fingerprint(model_name: str) -> str:
+    return hashlib.sha1(model_name.encode("utf-8")).hexdigest()[:12]
+
+
+class SQLiteEmbeddingStore:
+    """On-disk key -> float32 vector store shared by restarts and worker processes."""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        if not keys:
+            return found
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i : i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        if not items:
+            return
+        rows = [(key, array("f", vector).tobytes()) for key, vector in items.items()]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows
+            )
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def retain(self, keys: Iterable[str]) -> int:
+        """Delete every entry whose key is not in keys; returns how many were removed."""
+        with self._lock, self._conn:
+            self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS retained (key TEXT PRIMARY KEY)")
+            self._conn.execute("DELETE FROM retained")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO retained (key) VALUES (?)", ((key,) for key in keys)
+            )
+            removed = self._conn.execute(
+                "DELETE FROM embeddings WHERE key NOT IN (SELECT key FROM retained)"
+            ).rowcount
+            self._conn.execute("DELETE FROM retained")
+        return removed
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """Query-embedding cache in front of an Embeddings model.
+
+    Entries are keyed by the normalized term plus a fingerprint of the model name,
+    so a model change never serves stale vectors. Misses of one call are embedded
+    together in a single batch.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str,
+        maxsize: int = 4096,
+        path: Optional[Union[str, Path]] = None,
+    ):
+        self.embeddings = embeddings
+        self.fingerprint = model_fingerprint(model_name)
+        self.memory = LRUCache(maxsize=maxsize)
+        self.store = SQLiteEmbeddingStore(path) if path else None
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _key(self, text: str) -> str:
+        return f"{self.fingerprint}:v{TERM_KEY_VERSION}:{normalize_term(text)}"
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        vectors: Dict[str, List[float]] = {}
+
+        for key in dict.fromkeys(keys):
+            vector = self.memory.get(key)
+            if vector is not None:
+                vectors[key] = vector
+
+        missing = [key for key in dict.fromkeys(keys) if key not in vectors]
+        if missing and self.store is not None:
+            from_disk = self.store.get_many(missing)
+            for key, vector in from_disk.items():
+                self.memory.set(key, vector)
+            vectors.update(from_disk)
+            with self._lock:
+                self.disk_hits += len(from_disk)
+
+        # Embed the remaining misses in one forward pass (first spelling seen wins)
+        to_embed: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in to_embed:
+                to_embed[key] = text
+        if to_embed:
+            embedded = self.embeddings.embed_documents(list(to_embed.values()))
+            fresh = dict(zip(to_embed.keys(), embedded))
+            for key, vector in fresh.items():
+                self.memory.set(key, vector)
+            if self.store is not None:
+                self.store.put_many(fresh)
+            vectors.update(fresh)
+            with self._lock:
+                self.misses += len(fresh)
+
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "memory_hits": self.memory.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "size": len(self.memory),
+        }
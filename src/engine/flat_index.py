@@ -0,0 +1,448 @@
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from langchain_core.documents import Document
+from numpy.lib.format import open_memmap
+
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+FLAT_INDEX_DIRNAME = "flat_index"
+EMBEDDINGS_FILE = "embeddings.npy"
+COMPACT_FILE = "embeddings_compact.npy"
+QUANTIZATION_FILE = "quantization.npy"
+SQ_NORMS_FILE = "sq_norms.npy"
+METADATA_FILE = "metadata.arrow"
+MANIFEST_FILE = "manifest.json"
+
+# Rows read from Chroma per page when exporting
+EXPORT_PAGE_SIZE = 4000
+# Rows up-cast to float32 at a time when scanning a compact (float16/int8) matrix
+COMPACT_BLOCK_ROWS = 16384
+# Smallest number of first-pass candidates re-ranked at full precision per query
+MIN_RERANK_CANDIDATES = 50
+
+FLAT_INDEX_DTYPES = ("float32", "float16", "int8")
+# Bumped when the file layout changes, so older exports count as missing
+FLAT_INDEX_FORMAT = 2
+
+# Metadata column holding the Chroma ids; Chroma reserves the "chroma:" key prefix
+ID_COLUMN = "chroma:id"
+
+# Chroma where operators as Arrow kernels, and as Python comparisons for mixed types
+_COMPARISONS = {
+    "$eq": pc.equal,
+    "$ne": pc.not_equal,
+    "$in": lambda column, operand: pc.is_in(column, value_set=pa.array(operand)),
+    "$nin": lambda column, operand: pc.invert(pc.is_in(column, value_set=pa.array(operand))),
+    "$gt": pc.greater,
+    "$gte": pc.greater_equal,
+    "$lt": pc.less,
+    "$lte": pc.less_equal,
+}
+_PY_COMPARISONS = {
+    "$eq": lambda v, operand: v == operand,
+    "$ne": lambda v, operand: v != operand,
+    "$in": lambda v, operand: v in operand,
+    "$nin": lambda v, operand: v not in operand,
+    "$gt": lambda v, operand: v > operand,
+    "$gte": lambda v, operand: v >= operand,
+    "$lt": lambda v, operand: v < operand,
+    "$lte": lambda v, operand: v <= operand,
+}
+
+
+def flat_index_dir(db_path: Union[str, Path]) -> Path:
+    return Path(db_path) / FLAT_INDEX_DIRNAME
+
+
+def read_flat_index_version(index_dir: Union[str, Path]) -> Optional[str]:
+    """Index version the export was taken at, or None if there is no complete export."""
+    try:
+        with open(Path(index_dir) / MANIFEST_FILE, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("format") != FLAT_INDEX_FORMAT or "index_version" not in manifest:
+        return None
+    return str(manifest["index_version"])
+
+
+def int8_quantization(low: np.ndarray, high: np.ndarray) -> np.ndarray:
+    """(2, dim) scale and offset rows mapping per-dimension [low, high] onto int8 codes."""
+    scale = (high - low) / 255.0
+    scale[scale == 0] = 1.0
+    offset = low + 128.0 * scale
+    return np.stack([scale, offset]).astype(np.float32)
+
+
+def encode_int8(matrix: np.ndarray, quantization: np.ndarray) -> np.ndarray:
+    scale, offset = quantization
+    return np.clip(np.rint((matrix - offset) / scale), -128, 127).astype(np.int8)
+
+
+def quantize_int8(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-dimension scalar quantization: x ~= offset + scale * code, code in int8.
+
+    Returns the codes and a (2, dim) array holding the scale and offset rows.
+    """
+    if not len(matrix):
+        return np.zeros(matrix.shape, dtype=np.int8), np.zeros((2, matrix.shape[1]), dtype=np.float32)
+    quantization = int8_quantization(matrix.min(axis=0), matrix.max(axis=0))
+    return encode_int8(matrix, quantization), quantization
+
+
+def _metadata_table(ids: List[str], metadatas: List[Dict[str, Any]]) -> pa.Table:
+    # Chroma metadata values are never None, so null marks a key missing from a row
+    keys = sorted({key for meta in metadatas for key in meta})
+    columns = {ID_COLUMN: pa.array(ids, type=pa.string())}
+    columns.update({key: pa.array([meta.get(key) for meta in metadatas]) for key in keys})
+    return pa.table(columns)
+
+
+def export_flat_index(
+    db: Any,
+    index_dir: Union[str, Path],
+    index_version: str,
+    dtype: str = "float32",
+) -> int:
+    """Dump a Chroma collection as a contiguous embedding matrix plus columnar metadata.
+
+    Pages are written straight into the memory-mapped files, so the collection is
+    never held in memory at once. Document texts are not exported; ranking only
+    reads metadata. The float32 matrix is always written; with dtype "float16" or
+    "int8" a compact copy is added for the first-pass scan.
+    """
+    if dtype not in FLAT_INDEX_DTYPES:
+        raise ValueError(f"Unsupported flat index dtype: {dtype}")
+
+    # Build next to the live export, then swap directories
+    index_dir = Path(index_dir)
+    staging = index_dir.with_name(f".{index_dir.name}.{os.getpid()}.tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+
+    count = db._collection.count()
+    sq_norms = np.zeros(count, dtype=np.float32)
+    matrix: Optional[np.ndarray] = None
+    compact: Optional[np.ndarray] = None
+    low: Optional[np.ndarray] = None
+    high: Optional[np.ndarray] = None
+    tables: List[pa.Table] = []
+    offset = 0
+    while offset < count:
+        page = db._collection.get(
+            include=["embeddings", "metadatas"], limit=EXPORT_PAGE_SIZE, offset=offset
+        )
+        if not page["ids"]:
+            break
+        vectors = np.asarray(page["embeddings"], dtype=np.float32)
+        rows = slice(offset, offset + len(vectors))
+        if matrix is None:
+            shape = (count, vectors.shape[1])
+            matrix = open_memmap(staging / EMBEDDINGS_FILE, mode="w+", dtype=np.float32, shape=shape)
+            if dtype == "float16":
+                compact = open_memmap(staging / COMPACT_FILE, mode="w+", dtype=np.float16, shape=shape)
+            elif dtype == "int8":
+                compact = open_memmap(staging / COMPACT_FILE, mode="w+", dtype=np.int8, shape=shape)
+                low, high = vectors.min(axis=0), vectors.max(axis=0)
+        matrix[rows] = vectors
+        # Norms come from the float32 vectors so compact storage only rounds the dot products
+        sq_norms[rows] = np.einsum("ij,ij->i", vectors, vectors)
+        if dtype == "float16":
+            compact[rows] = vectors
+        elif dtype == "int8":
+            np.minimum(low, vectors.min(axis=0), out=low)
+            np.maximum(high, vectors.max(axis=0), out=high)
+        tables.append(
+            _metadata_table(page["ids"], [meta or {} for meta in page["metadatas"]])
+        )
+        offset += len(vectors)
+    if offset != count:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise RuntimeError(f"Collection changed during export ({offset} of {count} rows read)")
+
+    if matrix is None:
+        # Empty collection: nothing was mapped
+        matrix = np.zeros((0, 0), dtype=np.float32)
+        np.save(staging / EMBEDDINGS_FILE, matrix)
+        if dtype == "float16":
+            np.save(staging / COMPACT_FILE, matrix.astype(np.float16))
+        elif dtype == "int8":
+            codes, quantization = quantize_int8(matrix)
+            np.save(staging / COMPACT_FILE, codes)
+            np.save(staging / QUANTIZATION_FILE, quantization)
+    elif dtype == "int8":
+        # The scale needs every row's range, so codes are written in a second pass
+        quantization = int8_quantization(low, high)
+        for start in range(0, count, COMPACT_BLOCK_ROWS):
+            block = slice(start, start + COMPACT_BLOCK_ROWS)
+            compact[block] = encode_int8(matrix[block], quantization)
+        np.save(staging / QUANTIZATION_FILE, quantization)
+    for array in (matrix, compact):
+        if isinstance(array, np.memmap):
+            array.flush()
+    del matrix, compact
+    np.save(staging / SQ_NORMS_FILE, sq_norms)
+
+    metadata = (
+        pa.concat_tables(tables, promote_options="permissive")
+        if tables
+        else _metadata_table([], [])
+    )
+    with pa.OSFile(str(staging / METADATA_FILE), "wb") as sink:
+        with pa.ipc.new_file(sink, metadata.schema) as writer:
+            writer.write_table(metadata)
+    with open(staging / MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "index_version": index_version,
+                "count": count,
+                "dtype": dtype,
+                "format": FLAT_INDEX_FORMAT,
+            },
+            f,
+        )
+
+    # Processes that already mapped the old files keep reading them until they reload
+    retired = index_dir.with_name(f".{index_dir.name}.{os.getpid()}.old")
+    if index_dir.exists():
+        os.replace(index_dir, retired)
+    os.replace(staging, index_dir)
+    shutil.rmtree(retired, ignore_errors=True)
+
+    logger.info(f"Exported flat index ({count} vectors, {dtype}) to {index_dir}")
+    return count
+
+
+class _RowReader:
+    """Reads single rows of an .npy matrix with plain file reads instead of a mapping."""
+
+    def __init__(self, path: Path):
+        self._file = open(path, "rb")
+        major, _ = np.lib.format.read_magic(self._file)
+        if major == 1:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(self._file)
+        elif major == 2:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(self._file)
+        else:
+            raise ValueError(f"Unsupported .npy format version {major} in {path}")
+        if fortran_order or len(shape) != 2:
+            raise ValueError(f"Expected a C-ordered matrix in {path}")
+        self.shape = shape
+        self.dtype = dtype
+        self._row_bytes = shape[1] * dtype.itemsize
+        self._data_offset = self._file.tell()
+        self._lock = threading.Lock()
+
+    def read(self, rows: Sequence[int]) -> np.ndarray:
+        chunks = []
+        with self._lock:
+            for row in rows:
+                self._file.seek(self._data_offset + int(row) * self._row_bytes)
+                chunks.append(self._file.read(self._row_bytes))
+        return np.frombuffer(b"".join(chunks), dtype=self.dtype).reshape(len(chunks), self.shape[1])
+
+
+class FlatIndex:
+    """Exact top-k search over a memory-mapped embedding matrix.
+
+    Distances are squared L2, like Chroma's default space, so scores and the
+    ranking threshold carry over unchanged. The matrix and the Arrow metadata
+    columns are opened read-only with mmap, so worker processes on one host
+    share their pages through the OS cache. With a compact (float16/int8) export
+    the scan runs over the compact matrix and a few candidates per query are
+    re-scored from the float32 rows, so returned distances stay full precision;
+    the float32 file is then not mapped, only those rows are read on demand.
+    Returned documents carry metadata only, with empty page_content.
+    """
+
+    def __init__(self, index_dir: Union[str, Path], rerank_factor: int = 4):
+        index_dir = Path(index_dir)
+        with open(index_dir / MANIFEST_FILE, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.version = str(manifest["index_version"])
+
+        self.sq_norms = np.load(index_dir / SQ_NORMS_FILE, mmap_mode="r")
+        # The scan maps either the float32 matrix or its compact copy, never both
+        self.embeddings: Optional[np.ndarray] = None
+        self.compact: Optional[np.ndarray] = None
+        self.quantization: Optional[np.ndarray] = None
+        self._full_rows: Optional[_RowReader] = None
+        if (index_dir / COMPACT_FILE).exists():
+            self.compact = np.load(index_dir / COMPACT_FILE, mmap_mode="r")
+            self._full_rows = _RowReader(index_dir / EMBEDDINGS_FILE)
+        else:
+            self.embeddings = np.load(index_dir / EMBEDDINGS_FILE, mmap_mode="r")
+        if (index_dir / QUANTIZATION_FILE).exists():
+            self.quantization = np.load(index_dir / QUANTIZATION_FILE)
+        # First-pass candidates per requested neighbour when scanning compact vectors
+        self.rerank_factor = max(1, int(rerank_factor))
+
+        table = pa.ipc.open_file(pa.memory_map(str(index_dir / METADATA_FILE), "r")).read_all()
+        self.ids = table.column(ID_COLUMN).combine_chunks()
+        self.columns = table.drop_columns([ID_COLUMN])
+
+        # Preference filters repeat, so their row masks are kept
+        self._masks: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def metadata(self, row: int) -> Dict[str, Any]:
+        values = self.columns.slice(row, 1).to_pylist()[0]
+        return {key: value for key, value in values.items() if value is not None}
+
+    def document(self, row: int) -> Document:
+        return Document(id=self.ids[row].as_py(), page_content="", metadata=self.metadata(row))
+
+    def full_vectors(self, rows: Sequence[int]) -> np.ndarray:
+        """float32 vectors of the given rows."""
+        if self._full_rows is not None:
+            return self._full_rows.read(rows)
+        return np.asarray(self.embeddings[np.asarray(rows, dtype=np.intp)], dtype=np.float32)
+
+    def get(self, ids: Sequence[str]) -> Dict[str, Tuple[Document, np.ndarray]]:
+        """Document and float32 vector of each known id."""
+        positions = pc.index_in(pa.array(list(ids), type=pa.string()), value_set=self.ids)
+        found = [
+            (doc_id, row) for doc_id, row in zip(ids, positions.to_pylist()) if row is not None
+        ]
+        vectors = self.full_vectors([row for _, row in found])
+        return {
+            doc_id: (self.document(row), vector)
+            for (doc_id, row), vector in zip(found, vectors)
+        }
+
+    def _column_mask(self, key: str, condition: Any) -> np.ndarray:
+        if key not in self.columns.column_names:
+            return np.zeros(len(self), dtype=bool)
+        column = self.columns.column(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+
+        mask = np.ones(len(self), dtype=bool)
+        for op, operand in condition.items():
+            if op not in _COMPARISONS:
+                raise ValueError(f"Unsupported where operator: {op}")
+            try:
+                hits = _COMPARISONS[op](column, operand)
+                hits = pc.and_(pc.is_valid(column), pc.fill_null(hits, False))
+                mask &= hits.to_numpy(zero_copy_only=False)
+            except (pa.ArrowNotImplementedError, pa.ArrowInvalid, pa.ArrowTypeError):
+                # Operand of another type than the column: compare the Python values
+                mask &= np.fromiter(
+                    (v is not None and _PY_COMPARISONS[op](v, operand) for v in column.to_pylist()),
+                    dtype=bool,
+                    count=len(self),
+                )
+        return mask
+
+    def _where_mask(self, where: Dict[str, Any]) -> np.ndarray:
+        """Evaluate a Chroma-style metadata predicate into a boolean row mask."""
+        mask = np.ones(len(self), dtype=bool)
+        for key, condition in where.items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self._where_mask(clause)
+            elif key == "$or":
+                any_mask = np.zeros(len(self), dtype=bool)
+                for clause in condition:
+                    any_mask |= self._where_mask(clause)
+                mask &= any_mask
+            else:
+                mask &= self._column_mask(key, condition)
+        return mask
+
+    def _cached_mask(self, where: Dict[str, Any]) -> np.ndarray:
+        key = json.dumps(where, sort_keys=True)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = self._where_mask(where)
+            self._masks[key] = mask
+        return mask
+
+    def _dot(self, queries: np.ndarray) -> np.ndarray:
+        """Query-by-row dot products with a single matmul (blockwise for compact rows)."""
+        if self.compact is None:
+            return queries @ self.embeddings.T
+
+        bias = 0.0
+        if self.quantization is not None:
+            # q . (offset + scale * code) = q . offset + (q * scale) . code
+            scale, offset = self.quantization
+            bias = (queries @ offset)[:, None]
+            queries = queries * scale
+        dots = np.empty((len(queries), len(self)), dtype=np.float32)
+        for start in range(0, len(self), COMPACT_BLOCK_ROWS):
+            block = np.asarray(
+                self.compact[start : start + COMPACT_BLOCK_ROWS], dtype=np.float32
+            )
+            dots[:, start : start + len(block)] = queries @ block.T
+        return dots + bias
+
+    def query(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        k: int,
+        where: Optional[Dict[str, Any]] = None,
+    ) -> List[List[Tuple[Document, float]]]:
+        """Nearest rows per query vector as (Document, squared L2 distance), closest first."""
+        if not len(query_embeddings):
+            return []
+        if not len(self):
+            return [[] for _ in query_embeddings]
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        distances = (
+            np.einsum("ij,ij->i", queries, queries)[:, None]
+            + self.sq_norms[None, :]
+            - 2.0 * self._dot(queries)
+        )
+        np.maximum(distances, 0.0, out=distances)
+
+        candidates = None
+        if where:
+            candidates = np.flatnonzero(self._cached_mask(where))
+            distances = distances[:, candidates]
+
+        n = distances.shape[1]
+        k = min(k, n)
+        # Approximate first-pass distances need a wider shortlist for the re-rank
+        shortlist = k
+        if self.compact is not None:
+            shortlist = min(n, max(k * self.rerank_factor, MIN_RERANK_CANDIDATES))
+        results = []
+        for query, row in zip(queries, distances):
+            if k <= 0:
+                results.append([])
+                continue
+            if shortlist < n:
+                # Keep every row tied with the last shortlisted distance
+                kth = row[np.argpartition(row, shortlist - 1)[shortlist - 1]]
+                top = np.flatnonzero(row <= kth)
+            else:
+                top = np.arange(n)
+            rows = candidates[top] if candidates is not None else top
+
+            # Re-score the shortlist from the float32 rows; the expanded form above
+            # loses precision to cancellation (and to quantization when compact)
+            diff = self.full_vectors(rows) - query
+            exact = np.einsum("ij,ij->i", diff, diff)
+            # Ties resolve by row position so results are deterministic
+            order = np.lexsort((rows, exact))[:k]
+            results.append(
+                [
+                    (self.document(i), float(distance))
+                    for i, distance in zip(rows[order].tolist(), exact[order].tolist())
+                ]
+            )
+        return results
@@ -0,0 +1,61 @@
+import json
+from typing import Any, Dict, List, Sequence
+
+from langchain_core.messages import BaseMessage, SystemMessage
+
+# Upper bound on remembered skills, so the folded state stays small
+MAX_PRIOR_SKILLS = 15
+
+
+def update_conversation_state(
+    state: Dict[str, Any], analysis_result: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Fold one turn's analysis into the compact conversation state."""
+    new_state = dict(state)
+
+    for key in ("current_role", "target_role"):
+        value = analysis_result.get(key)
+        if value:
+            new_state[key] = value
+
+    if analysis_result.get("detected_language"):
+        new_state["language"] = str(analysis_result["detected_language"]).upper()
+    if "preference_free" in analysis_result:
+        new_state["preference_free"] = bool(analysis_result["preference_free"])
+
+    # Newest skills first, without duplicates
+    skills = [
+        str(item.get("display_name") or item.get("search_term_en") or "")
+        for item in analysis_result.get("missing_skills") or []
+        if isinstance(item, dict)
+    ]
+    merged: List[str] = []
+    for skill in skills + list(new_state.get("prior_missing_skills", [])):
+        if skill and skill not in merged:
+            merged.append(skill)
+    new_state["prior_missing_skills"] = merged[:MAX_PRIOR_SKILLS]
+
+    return new_state
+
+
+def compact_history(
+    messages: Sequence[BaseMessage], state: Dict[str, Any], keep_turns: int
+) -> List[BaseMessage]:
+    """Keep the last keep_turns turns verbatim and replace older ones with the state.
+
+    The state covers every turn so far, including the ones kept verbatim, and
+    is labelled as such. keep_turns <= 0 disables compaction.
+    """
+    keep_messages = keep_turns * 2
+    if keep_turns <= 0 or len(messages) <= keep_messages:
+        return list(messages)
+
+    recent = list(messages[-keep_messages:])
+    if not state:
+        return recent
+
+    summary = SystemMessage(
+        content="Current conversation state, summarizing all turns so far (use as CONTEXT): "
+        + json.dumps(state, ensure_ascii=False)
+    )
+    return [summary] + recent
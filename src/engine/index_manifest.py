@@ -0,0 +1,136 @@
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+MANIFEST_FILE = "index_manifest.sqlite"
+
+# Metadata-only page size for the fallback scan of the collection
+SCAN_PAGE_SIZE = 5000
+
+# doc_id -> (content_hash, attributes_version)
+ManifestEntries = Dict[str, Tuple[str, Optional[int]]]
+
+
+class IndexManifest:
+    """Compact id -> content hash table kept next to the vector store.
+
+    The delta check reads it instead of pulling every document out of Chroma.
+    It is trusted only when its stamp matches the store's index version; any
+    write first clears the stamp, so an interrupted update falls back to a scan.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "doc_id TEXT PRIMARY KEY, content_hash TEXT NOT NULL, attributes_version INTEGER)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def index_version(self) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM meta WHERE key = 'index_version'"
+            ).fetchone()
+        return row[0] if row and row[0] else None
+
+    def _set_version(self, version: str) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('index_version', ?)",
+            (version,),
+        )
+
+    def is_current(self, index_version: str, count: int) -> bool:
+        return self.index_version() == index_version and len(self) == count
+
+    def entries(self) -> ManifestEntries:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id, content_hash, attributes_version FROM entries"
+            ).fetchall()
+        return {doc_id: (content_hash, version) for doc_id, content_hash, version in rows}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def upsert(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Record one written batch (hashes and attribute versions from its metadata)."""
+        rows = [
+            (doc_id, meta.get("content_hash", ""), meta.get("attributes_version"))
+            for doc_id, meta in zip(ids, metadatas)
+        ]
+        with self._lock, self._conn:
+            self._set_version("")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries (doc_id, content_hash, attributes_version) "
+                "VALUES (?, ?, ?)",
+                rows,
+            )
+
+    def delete(self, ids: List[str]) -> None:
+        with self._lock, self._conn:
+            self._set_version("")
+            self._conn.executemany(
+                "DELETE FROM entries WHERE doc_id = ?", [(doc_id,) for doc_id in ids]
+            )
+
+    def replace_all(self, entries: ManifestEntries, index_version: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.executemany(
+                "INSERT INTO entries (doc_id, content_hash, attributes_version) VALUES (?, ?, ?)",
+                [(doc_id, h, v) for doc_id, (h, v) in entries.items()],
+            )
+            self._set_version(index_version)
+
+    def mark_current(self, index_version: str) -> None:
+        with self._lock, self._conn:
+            self._set_version(index_version)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def scan_collection(db: Any) -> ManifestEntries:
+    """Paged, metadata-only read of the collection (no documents or embeddings)."""
+    entries: ManifestEntries = {}
+    offset = 0
+    while True:
+        page = db._collection.get(
+            include=["metadatas"], limit=SCAN_PAGE_SIZE, offset=offset
+        )
+        if not page["ids"]:
+            break
+        for doc_id, meta in zip(page["ids"], page["metadatas"]):
+            meta = meta or {}
+            entries[doc_id] = (meta.get("content_hash", ""), meta.get("attributes_version"))
+        offset += len(page["ids"])
+    return entries
+
+
+def load_existing_entries(
+    db: Any, manifest: IndexManifest, index_version: str
+) -> ManifestEntries:
+    """Existing id -> (hash, attributes version), from the manifest when it is current."""
+    count = db._collection.count()
+    if manifest.is_current(index_version, count):
+        return manifest.entries()
+
+    logger.info("Index manifest missing or stale. Scanning collection metadata...")
+    entries = scan_collection(db)
+    manifest.replace_all(entries, index_version)
+    return entries
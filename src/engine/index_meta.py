@@ -0,0 +1,38 @@
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Union
+
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+INDEX_VERSION_FILE = "index_version.json"
+
+
+def read_index_version(db_path: Union[str, Path]) -> str:
+    """Return the version stamp of the vector store, or "0" if it was never stamped."""
+    version_path = Path(db_path) / INDEX_VERSION_FILE
+    try:
+        with open(version_path, "r", encoding="utf-8") as f:
+            return str(json.load(f).get("version", "0"))
+    except (OSError, ValueError):
+        return "0"
+
+
+def bump_index_version(db_path: Union[str, Path]) -> str:
+    """Write a new version stamp; readers treat any change as an invalidation."""
+    db_path = Path(db_path)
+    db_path.mkdir(parents=True, exist_ok=True)
+    version = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+
+    # Write then rename so concurrent readers never see a half-written file
+    tmp_path = db_path / f".{INDEX_VERSION_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "updated_at": time.time()}, f)
+    os.replace(tmp_path, db_path / INDEX_VERSION_FILE)
+
+    logger.info(f"Index version set to {version}")
+    return version
@@ -0,0 +1,198 @@
+import json
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from src.engine.course_attributes import is_thai_text
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    from pythainlp.tokenize import word_tokenize as thai_word_tokenize
+except ImportError:
+    thai_word_tokenize = None
+    logger.warning(
+        "PyThaiNLP is not installed; Thai text is indexed as character bigrams, "
+        "which matches less precisely than dictionary segmentation"
+    )
+
+LEXICAL_INDEX_FILE = "lexical_index.sqlite"
+
+# Dictionary segmentation when PyThaiNLP is installed, character bigrams otherwise.
+# Stored with the index so a tokenizer change forces a rebuild.
+TOKENIZER = "newmm" if thai_word_tokenize is not None else "bigram"
+
+# Thai runs are segmented separately; elsewhere words keep a trailing + or # (C++, C#)
+TOKEN_PATTERN = re.compile(r"[\u0E00-\u0E7F]+|[^\W_]+[+#]*")
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+def _segment_thai(run: str) -> List[str]:
+    if thai_word_tokenize is not None:
+        return [
+            word
+            for word in thai_word_tokenize(run, engine="newmm", keep_whitespace=False)
+            if word.strip()
+        ]
+    # Without a dictionary, overlapping bigrams still match words inside unspaced text
+    if len(run) < 2:
+        return [run]
+    return [run[i : i + 2] for i in range(len(run) - 1)]
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased word tokens; Thai text (written without spaces) is segmented."""
+    text = unicodedata.normalize("NFC", str(text)).casefold()
+    tokens: List[str] = []
+    for match in TOKEN_PATTERN.finditer(text):
+        token = match.group(0)
+        if is_thai_text(token[0]):
+            tokens.extend(_segment_thai(token))
+        else:
+            tokens.append(token)
+    return tokens
+
+
+def course_search_text(title: str, category: str, description: str) -> str:
+    """Fields of a course that feed the lexical index."""
+    return " ".join(str(part) for part in (title, category, description) if part)
+
+
+class LexicalIndex:
+    """In-memory BM25 index with postings in flat NumPy arrays (CSR layout).
+
+    Each posting already holds its BM25 weight, so a query is a handful of
+    vectorized adds followed by argpartition.
+    """
+
+    def __init__(self, doc_ids: List[str], doc_terms: List[Dict[str, int]]):
+        self.doc_ids = doc_ids
+        n_docs = len(doc_ids)
+        lengths = np.asarray([sum(terms.values()) for terms in doc_terms], dtype=np.float32)
+        avg_length = float(lengths.mean()) if n_docs and lengths.sum() else 1.0
+
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        for row, terms in enumerate(doc_terms):
+            for term, tf in terms.items():
+                postings.setdefault(term, []).append((row, tf))
+
+        self.vocabulary: Dict[str, int] = {}
+        offsets = [0]
+        rows: List[int] = []
+        tfs: List[int] = []
+        for term, entries in postings.items():
+            self.vocabulary[term] = len(self.vocabulary)
+            rows.extend(row for row, _ in entries)
+            tfs.extend(tf for _, tf in entries)
+            offsets.append(len(rows))
+
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.rows = np.asarray(rows, dtype=np.int32)
+        tf = np.asarray(tfs, dtype=np.float32)
+        doc_freq = np.diff(self.offsets).astype(np.float32)
+        idf = np.log1p((n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+        norm = BM25_K1 * (1.0 - BM25_B + BM25_B * lengths[self.rows] / avg_length)
+        self.weights = (
+            np.repeat(idf, np.diff(self.offsets)) * tf * (BM25_K1 + 1.0) / (tf + norm)
+        ).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def search(self, text: str, k: int) -> List[Tuple[str, float]]:
+        """Top-k (doc_id, BM25 score) for a query, best first."""
+        term_ids = {
+            self.vocabulary[token] for token in tokenize(text) if token in self.vocabulary
+        }
+        if not term_ids or k <= 0:
+            return []
+
+        scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            # A term lists each document once, so fancy-index adds do not collide
+            scores[self.rows[start:end]] += self.weights[start:end]
+
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        # Ties resolve by row position so results are deterministic
+        hits = hits[np.lexsort((hits, -scores[hits]))]
+        return [(self.doc_ids[row], float(scores[row])) for row in hits.tolist()]
+
+
+class LexicalIndexStore:
+    """Per-document term counts on disk, updated incrementally with the vector store."""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents (doc_id TEXT PRIMARY KEY, terms TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def tokenizer(self) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM meta WHERE key = 'tokenizer'"
+            ).fetchone()
+        return row[0] if row else None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def update(
+        self,
+        upserts: Dict[str, str],
+        deletes: List[str],
+        rebuild: bool = False,
+    ) -> None:
+        """Apply one ingestion run in a single transaction (rebuild clears the index first)."""
+        rows = [
+            (doc_id, json.dumps(Counter(tokenize(text)), ensure_ascii=False))
+            for doc_id, text in upserts.items()
+        ]
+        with self._lock, self._conn:
+            if rebuild:
+                self._conn.execute("DELETE FROM documents")
+            self._conn.executemany(
+                "DELETE FROM documents WHERE doc_id = ?", [(doc_id,) for doc_id in deletes]
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO documents (doc_id, terms) VALUES (?, ?)", rows
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('tokenizer', ?)",
+                (TOKENIZER,),
+            )
+
+    def load(self) -> LexicalIndex:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id, terms FROM documents ORDER BY doc_id"
+            ).fetchall()
+        return LexicalIndex(
+            [doc_id for doc_id, _ in rows], [json.loads(terms) for _, terms in rows]
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,135 @@
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.engine.course_attributes import (
+    BUCKET_FREE,
+    BUCKET_OTHER,
+    BUCKET_THAI,
+    bucket_of,
+)
+
+# Tier of each bucket per request mode: 0 = preferred, 1 = fill-up, 2 = never picked.
+# The fill-up order mirrors the list concatenation of the original selection logic,
+# which decides ties between equal scores.
+_EXCLUDED = 2
+
+
+def _bucket_tiers(user_lang: str, prefer_free: bool) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (tier, tie-break rank) lookup tables indexed by bucket code."""
+    tiers = np.full(3, _EXCLUDED, dtype=np.int8)
+    fill_order = np.zeros(3, dtype=np.int8)
+    if prefer_free:
+        tiers[BUCKET_FREE] = 0
+        tiers[BUCKET_THAI if user_lang == "TH" else BUCKET_OTHER] = 1
+    elif user_lang == "TH":
+        tiers[BUCKET_THAI] = 0
+        tiers[[BUCKET_OTHER, BUCKET_FREE]] = 1
+        fill_order[[BUCKET_OTHER, BUCKET_FREE]] = [0, 1]
+    else:
+        tiers[BUCKET_OTHER] = 0
+        tiers[[BUCKET_FREE, BUCKET_THAI]] = 1
+        fill_order[[BUCKET_FREE, BUCKET_THAI]] = [0, 1]
+    return tiers, fill_order
+
+
+def rank_candidates(
+    per_skill_results: Sequence[Sequence[Tuple[Document, float]]],
+    user_lang: str,
+    prefer_free: bool,
+    k: int = 2,
+    threshold: float = 20.0,
+    by_position: bool = False,
+) -> List[List[Tuple[Document, float]]]:
+    """Columnar ranking of the candidates of all skills in a request.
+
+    Per skill: dedupe by URL (keeping the best score), drop scores above threshold,
+    then take the top k by (bucket tier, score). Only the picked documents are
+    returned, in order, so callers build course dicts for those alone.
+
+    With by_position, each skill's list is already in rank order (e.g. fused):
+    the earliest occurrence of a URL is kept and position replaces score.
+    """
+    n_skills = len(per_skill_results)
+    docs: List[Document] = []
+    skill_list: List[int] = []
+    score_list: List[float] = []
+    bucket_list: List[int] = []
+    url_list: List[str] = []
+    for skill, results in enumerate(per_skill_results):
+        for doc, score in results:
+            docs.append(doc)
+            skill_list.append(skill)
+            score_list.append(score)
+            bucket_list.append(bucket_of(doc.metadata))
+            url = doc.metadata.get("url")
+            url_list.append("\x00" if url is None else str(url))
+
+    picks: List[List[Tuple[Document, float]]] = [[] for _ in range(n_skills)]
+    if not docs:
+        return picks
+
+    skill_ids = np.asarray(skill_list, dtype=np.int32)
+    scores = np.asarray(score_list, dtype=np.float64)
+    buckets = np.asarray(bucket_list, dtype=np.int8)
+    _, url_ids = np.unique(np.asarray(url_list, dtype=object), return_inverse=True)
+    positions = np.arange(len(docs))
+
+    # Dedupe (skill, url): best score wins, earliest position on ties
+    if by_position:
+        order = np.lexsort((positions, url_ids, skill_ids))
+    else:
+        order = np.lexsort((positions, scores, url_ids, skill_ids))
+    group_start = np.ones(len(order), dtype=bool)
+    group_start[1:] = (skill_ids[order][1:] != skill_ids[order][:-1]) | (
+        url_ids[order][1:] != url_ids[order][:-1]
+    )
+    group_ids = np.cumsum(group_start) - 1
+    # Ties between equal scores follow the first time a URL was seen
+    first_seen = np.minimum.reduceat(positions[order], np.flatnonzero(group_start))
+    kept = order[group_start]
+    kept_first_seen = first_seen[group_ids[group_start]]
+
+    tiers_by_bucket, fill_by_bucket = _bucket_tiers(user_lang, prefer_free)
+    tiers = tiers_by_bucket[buckets[kept]]
+    eligible = (scores[kept] <= threshold) & (tiers != _EXCLUDED)
+    kept, kept_first_seen, tiers = kept[eligible], kept_first_seen[eligible], tiers[eligible]
+    fill = fill_by_bucket[buckets[kept]]
+    kept_skills = skill_ids[kept]
+    kept_scores = scores[kept]
+
+    primary = kept_first_seen.astype(np.float64) if by_position else kept_scores
+
+    # Keys are bounded, so tier * span + key orders by (tier, key)
+    span = (primary.max() - primary.min() + 1.0) if len(kept) else 1.0
+    keys = tiers * span + primary
+
+    for skill in range(n_skills):
+        idx = np.flatnonzero(kept_skills == skill)
+        if not len(idx):
+            continue
+        if len(idx) > k:
+            # Preselect the k best keys, keeping every candidate tied with the k-th
+            kth = np.argpartition(keys[idx], k - 1)[:k]
+            cutoff = keys[idx][kth].max()
+            idx = idx[keys[idx] <= cutoff]
+        ranked = idx[
+            np.lexsort(
+                (kept_first_seen[idx], fill[idx], primary[idx], tiers[idx])
+            )
+        ][:k]
+        picks[skill] = [(docs[i], float(scores[i])) for i in kept[ranked]]
+
+    return picks
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[str]], k: int = 60
+) -> Dict[str, float]:
+    """RRF score per id: the sum of 1 / (k + rank) over the rankings listing it."""
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return fused
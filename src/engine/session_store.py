@@ -0,0 +1,307 @@
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from langchain_community.chat_message_histories import ChatMessageHistory
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from pydantic import Field
+
+from src.config import (
+    SESSION_BACKEND,
+    SESSION_DB_PATH,
+    SESSION_IDLE_TTL,
+    SESSION_MAX_SESSIONS,
+    SESSION_MAX_TURNS,
+)
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class BoundedChatMessageHistory(ChatMessageHistory):
+    """In-memory history that keeps only the most recent max_messages messages."""
+
+    max_messages: int = 0
+    # Compact structured state of the conversation (see history_compaction)
+    state: Dict[str, Any] = Field(default_factory=dict)
+
+    def add_message(self, message: BaseMessage) -> None:
+        super().add_message(message)
+        if self.max_messages and len(self.messages) > self.max_messages:
+            self.messages = self.messages[-self.max_messages :]
+
+
+class SessionStore(ABC):
+    """Backend that hands out the chat history of a session.
+
+    Limits (all optional, 0 disables):
+    - max_sessions: least recently used sessions are evicted above this count
+    - idle_ttl: sessions idle for longer than this many seconds are dropped
+    - max_turns: only the last N human/AI turns of a session are kept
+    """
+
+    def __init__(self, max_sessions: int = 0, idle_ttl: float = 0, max_turns: int = 0):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_turns = max_turns
+
+    @property
+    def max_messages(self) -> int:
+        return self.max_turns * 2
+
+    @abstractmethod
+    def get_history(self, session_id: str) -> BaseChatMessageHistory:
+        """Return the (possibly new) history of a session and mark it as used."""
+
+    @abstractmethod
+    def get_state(self, session_id: str) -> Dict[str, Any]:
+        """Return the compact conversation state stored with a session."""
+
+    @abstractmethod
+    def set_state(self, session_id: str, state: Dict[str, Any]) -> None:
+        """Replace the compact conversation state of a session."""
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        """Forget a session."""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of live sessions."""
+
+
+class InMemorySessionStore(SessionStore):
+    def __init__(self, max_sessions: int = 0, idle_ttl: float = 0, max_turns: int = 0):
+        super().__init__(max_sessions, idle_ttl, max_turns)
+        self._sessions: "OrderedDict[str, Tuple[BoundedChatMessageHistory, float]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float) -> None:
+        if self.idle_ttl:
+            # Oldest entries come first, so stop at the first live one
+            while self._sessions:
+                session_id, (_, last_access) = next(iter(self._sessions.items()))
+                if now - last_access <= self.idle_ttl:
+                    break
+                del self._sessions[session_id]
+        if self.max_sessions:
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def get_history(self, session_id: str) -> BaseChatMessageHistory:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None and self.idle_ttl and now - entry[1] > self.idle_ttl:
+                entry = None
+            history = (
+                entry[0]
+                if entry is not None
+                else BoundedChatMessageHistory(max_messages=self.max_messages)
+            )
+            self._sessions[session_id] = (history, now)
+            self._sessions.move_to_end(session_id)
+            self._evict(now)
+        return history
+
+    def get_state(self, session_id: str) -> Dict[str, Any]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+        return dict(entry[0].state) if entry is not None else {}
+
+    def set_state(self, session_id: str, state: Dict[str, Any]) -> None:
+        self.get_history(session_id).state = dict(state)
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SQLiteChatMessageHistory(BaseChatMessageHistory):
+    """Chat history of one session persisted in a SQLiteSessionStore."""
+
+    def __init__(self, store: "SQLiteSessionStore", session_id: str):
+        self.store = store
+        self.session_id = session_id
+
+    @property
+    def messages(self) -> List[BaseMessage]:  # type: ignore[override]
+        return self.store._load_messages(self.session_id)
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self.store._append_messages(self.session_id, messages)
+
+    def clear(self) -> None:
+        self.store._clear_messages(self.session_id)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Session store in a SQLite file: survives restarts and is shared by processes on a host."""
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        max_sessions: int = 0,
+        idle_ttl: float = 0,
+        max_turns: int = 0,
+    ):
+        super().__init__(max_sessions, idle_ttl, max_turns)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.path), timeout=30, check_same_thread=False
+        )
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, last_access REAL NOT NULL)"
+            )
+            columns = {
+                row[1]
+                for row in self._conn.execute("PRAGMA table_info(sessions)").fetchall()
+            }
+            if "state" not in columns:
+                self._conn.execute("ALTER TABLE sessions ADD COLUMN state TEXT")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_sessions_last_access ON sessions (last_access)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "session_id TEXT NOT NULL, message TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id)"
+            )
+
+    def _delete_sessions(self, where: str, params: Sequence) -> None:
+        self._conn.execute(
+            f"DELETE FROM messages WHERE session_id IN (SELECT session_id FROM sessions WHERE {where})",
+            params,
+        )
+        self._conn.execute(f"DELETE FROM sessions WHERE {where}", params)
+
+    def _evict(self, now: float) -> None:
+        if self.idle_ttl:
+            self._delete_sessions("last_access < ?", (now - self.idle_ttl,))
+        if self.max_sessions:
+            self._delete_sessions(
+                "session_id NOT IN (SELECT session_id FROM sessions "
+                "ORDER BY last_access DESC LIMIT ?)",
+                (self.max_sessions,),
+            )
+
+    def _touch(self, session_id: str) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT last_access FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row and self.idle_ttl and now - row[0] > self.idle_ttl:
+                # Expired: start over with an empty history
+                self._conn.execute(
+                    "DELETE FROM messages WHERE session_id = ?", (session_id,)
+                )
+                self._conn.execute(
+                    "UPDATE sessions SET state = NULL WHERE session_id = ?",
+                    (session_id,),
+                )
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, last_access) VALUES (?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET last_access = excluded.last_access",
+                (session_id, now),
+            )
+            self._evict(now)
+
+    def get_history(self, session_id: str) -> BaseChatMessageHistory:
+        self._touch(session_id)
+        return SQLiteChatMessageHistory(self, session_id)
+
+    def get_state(self, session_id: str) -> Dict[str, Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row and row[0] else {}
+
+    def set_state(self, session_id: str, state: Dict[str, Any]) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, last_access, state) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET "
+                "last_access = excluded.last_access, state = excluded.state",
+                (session_id, time.time(), json.dumps(state, ensure_ascii=False)),
+            )
+
+    def delete(self, session_id: str) -> None:
+        with self._lock, self._conn:
+            self._delete_sessions("session_id = ?", (session_id,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def _load_messages(self, session_id: str) -> List[BaseMessage]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT message FROM messages WHERE session_id = ? ORDER BY id",
+                (session_id,),
+            ).fetchall()
+        return messages_from_dict([json.loads(row[0]) for row in rows])
+
+    def _append_messages(
+        self, session_id: str, messages: Sequence[BaseMessage]
+    ) -> None:
+        rows = [
+            (session_id, json.dumps(message_to_dict(m), ensure_ascii=False))
+            for m in messages
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO messages (session_id, message) VALUES (?, ?)", rows
+            )
+            if self.max_messages:
+                self._conn.execute(
+                    "DELETE FROM messages WHERE session_id = ? AND id NOT IN ("
+                    "SELECT id FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?)",
+                    (session_id, session_id, self.max_messages),
+                )
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, last_access) VALUES (?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET last_access = excluded.last_access",
+                (session_id, time.time()),
+            )
+
+    def _clear_messages(self, session_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+
+
+def create_session_store(
+    backend: str = SESSION_BACKEND,
+    path: Optional[Union[str, Path]] = SESSION_DB_PATH,
+    max_sessions: int = SESSION_MAX_SESSIONS,
+    idle_ttl: float = SESSION_IDLE_TTL,
+    max_turns: int = SESSION_MAX_TURNS,
+) -> SessionStore:
+    """Build the session store selected in the config ("memory" or "sqlite")."""
+    backend = backend.lower()
+    if backend == "sqlite":
+        logger.info(f"Using SQLite session store at {path}")
+        return SQLiteSessionStore(path, max_sessions, idle_ttl, max_turns)
+    if backend != "memory":
+        raise ValueError(f"Unknown session backend: {backend}")
+    return InMemorySessionStore(max_sessions, idle_ttl, max_turns)
@@ -1,7 +1,13 @@
+import asyncio
+import copy
 import json
-import re
 import os
-from typing import Dict, List, Any, Optional, Tuple
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+import numpy as np
 
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import (
@@ -10,23 +16,63 @@ from langchain_core.prompts import (
     MessagesPlaceholder,
 )
 from langchain_core.output_parsers import JsonOutputParser
-from langchain_community.chat_message_histories import ChatMessageHistory
+from langchain_core.messages import AIMessage, HumanMessage
 from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.runnables import RunnableConfig, RunnableLambda, RunnablePassthrough
 from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
 from langchain_core.documents import Document
 
 from src.config import (
     GOOGLE_API_KEY,
     VECTOR_STORE_DIR,
-    EMBEDDING_MODEL_NAME,
     MODEL_NAME,
+    SEARCH_WORKERS,
+    STREAM_ANALYSIS,
+    EMBEDDING_CACHE_SIZE,
+    EMBEDDING_CACHE_PATH,
+    ANALYSIS_CACHE_SIZE,
+    ANALYSIS_CACHE_TTL,
+    ANALYSIS_CACHE_SIMILARITY,
+    RECOMMENDATION_CACHE_SIZE,
+    HISTORY_KEEP_TURNS,
+    FILTERED_SEARCH,
+    FILTERED_SEARCH_K,
+    FILTERED_SEARCH_MAX_K,
+    RETRIEVAL_BACKEND,
+    FLAT_INDEX_RERANK_FACTOR,
+    HYBRID_SEARCH,
+    LEXICAL_SEARCH_K,
+    RRF_K,
+)
+from src.engine.analysis_cache import AnalysisCache
+from src.engine.course_attributes import (
+    BUCKET_FREE,
+    BUCKET_OTHER,
+    BUCKET_THAI,
+    bucket_filter,
+    clean_duration,
+    has_precomputed_attributes,
+    is_thai_text,
 )
+from src.engine.embedding_backend import embedding_fingerprint, get_embedding_model
+from src.engine.embedding_cache import CachedEmbeddings, normalize_term
+from src.engine.flat_index import FlatIndex, flat_index_dir, read_flat_index_version
+from src.engine.lexical_index import LEXICAL_INDEX_FILE, LexicalIndex, LexicalIndexStore
+from src.engine.history_compaction import compact_history, update_conversation_state
+from src.engine.index_meta import read_index_version
+from src.engine.ranking import rank_candidates, reciprocal_rank_fusion
+from src.engine.session_store import SessionStore, create_session_store
+from src.utils.cache import LRUCache
 from src.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Distance above which a course is considered a poor match
+SCORE_THRESHOLD = 20.0
+# Courses suggested per skill
+COURSES_PER_SKILL = 2
+
 
 class SkillEngine:
     def __init__(
@@ -34,23 +80,63 @@ class SkillEngine:
         google_api_key: Optional[str] = None,
         db_path: Optional[str] = None,
         model_name: str = MODEL_NAME,
+        search_workers: int = SEARCH_WORKERS,
+        stream_analysis: bool = STREAM_ANALYSIS,
+        session_store: Optional[SessionStore] = None,
     ):
-        # Initialize Memory Store
-        self.session_store = {}
+        # Initialize Memory Store (bounded; SQLite-backed when configured)
+        self.session_store = (
+            session_store if session_store is not None else create_session_store()
+        )
+        # Turns replayed verbatim; older ones are folded into a compact state
+        self.history_keep_turns = HISTORY_KEEP_TURNS
+
+        # Per-skill retrieval runs in parallel when more than one worker is configured
+        self.search_workers = max(1, int(search_workers))
+        # Streaming starts each skill's search while the LLM is still generating
+        self.stream_analysis = stream_analysis
+        self.executor = (
+            ThreadPoolExecutor(
+                max_workers=self.search_workers, thread_name_prefix="skill-search"
+            )
+            if self.search_workers > 1 or self.stream_analysis
+            else None
+        )
 
         # Initialize Embeddings
-        self.embedding_model = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+        self.embedding_model = get_embedding_model()
+        # Search terms repeat a lot across requests, so query vectors are cached
+        self.query_embeddings = CachedEmbeddings(
+            self.embedding_model,
+            model_name=embedding_fingerprint(),
+            maxsize=EMBEDDING_CACHE_SIZE,
+            path=EMBEDDING_CACHE_PATH,
+        )
 
         # Path Handling
         real_db_path = str(db_path) if db_path else str(VECTOR_STORE_DIR)
 
+        self.db_path = real_db_path
+
+        # Memory-mapped export answering queries instead of Chroma when selected
+        self.flat_index: Optional[FlatIndex] = None
+        self._flat_index_version: Optional[str] = None
+        # BM25 index whose hits are fused with the vector results
+        self.lexical_index: Optional[LexicalIndex] = None
+        self._lexical_index_version: Optional[str] = None
+        self._index_lock = threading.Lock()
+
         if os.path.exists(real_db_path):
             self.db = Chroma(
                 persist_directory=real_db_path, embedding_function=self.embedding_model
             )
             logger.info(f"Vector Database loaded from {real_db_path}")
+            self._refresh_indexes(read_index_version(real_db_path))
+            # Preference filters are pushed into the query when the store has the flags
+            self.filtered_search = FILTERED_SEARCH and self._store_has_attributes()
         else:
             self.db = None
+            self.filtered_search = False
             logger.warning(
                 f"Vector Database not found at {real_db_path}. Search functionality will be limited."
             )
@@ -60,23 +146,139 @@ class SkillEngine:
         if not api_key:
             raise ValueError("Google API Key not found. Please check your .env file.")
 
+        self.model_name = model_name
         self.llm = ChatGoogleGenerativeAI(
             model=model_name, google_api_key=api_key, temperature=0
         )
 
+        # Identical (or near-identical first-turn) messages reuse a previous analysis
+        self.analysis_cache = (
+            AnalysisCache(
+                maxsize=ANALYSIS_CACHE_SIZE,
+                ttl=ANALYSIS_CACHE_TTL,
+                similarity_threshold=ANALYSIS_CACHE_SIMILARITY,
+                embeddings=self.query_embeddings,
+            )
+            if ANALYSIS_CACHE_SIZE > 0
+            else None
+        )
+
+        # Ranked courses per (terms, language, free preference, index version)
+        self.recommendation_cache = LRUCache(maxsize=RECOMMENDATION_CACHE_SIZE)
+
+    def close(self) -> None:
+        """Stop the search worker threads; the engine must not be used afterwards."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    def __enter__(self) -> "SkillEngine":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
     def get_session_history(self, session_id: str) -> BaseChatMessageHistory:
-        if session_id not in self.session_store:
-            self.session_store[session_id] = ChatMessageHistory()
-        return self.session_store[session_id]
+        return self.session_store.get_history(session_id)
+
+    def _compact_history(
+        self, inputs: Dict[str, Any], config: RunnableConfig
+    ) -> List[Any]:
+        session_id = config.get("configurable", {}).get("session_id", "default_session")
+        return compact_history(
+            inputs.get("history", []),
+            self.session_store.get_state(session_id),
+            self.history_keep_turns,
+        )
+
+    def _remember_state(self, session_id: str, analysis_result: Any) -> None:
+        """Fold this turn's analysis into the session's compact conversation state."""
+        if not isinstance(analysis_result, dict):
+            return
+        state = self.session_store.get_state(session_id)
+        self.session_store.set_state(
+            session_id, update_conversation_state(state, analysis_result)
+        )
+
+    def _store_has_attributes(self) -> bool:
+        try:
+            sample = self.db._collection.get(limit=1, include=["metadatas"])
+        except Exception as e:
+            logger.warning(f"Could not inspect vector store metadata: {e}")
+            return False
+        metadatas = sample.get("metadatas") or []
+        return bool(metadatas) and has_precomputed_attributes(metadatas[0] or {})
+
+    def _refresh_indexes(self, index_version: str) -> None:
+        """Reload the in-process indexes built for another index version."""
+        self._refresh_flat_index(index_version)
+        self._refresh_lexical_index(index_version)
+
+    def _current_index_version(self) -> str:
+        """Index version on disk, with the in-process indexes brought up to it."""
+        index_version = read_index_version(self.db_path)
+        self._refresh_indexes(index_version)
+        return index_version
+
+    def _refresh_lexical_index(self, index_version: str) -> None:
+        if not HYBRID_SEARCH or index_version == self._lexical_index_version:
+            return
+        with self._index_lock:
+            if index_version == self._lexical_index_version:
+                return
+            path = Path(self.db_path) / LEXICAL_INDEX_FILE
+            lexical_index = None
+            if path.exists():
+                try:
+                    store = LexicalIndexStore(path)
+                    try:
+                        lexical_index = store.load()
+                    finally:
+                        store.close()
+                except Exception as e:
+                    logger.warning(f"Could not load lexical index from {path}: {e}")
+            if lexical_index is not None and len(lexical_index):
+                logger.info(f"Lexical index loaded ({len(lexical_index)} documents)")
+            elif self._lexical_index_version is None:
+                logger.warning(f"Lexical index not found at {path}. Using vector search only.")
+            self.lexical_index = lexical_index if lexical_index is not None and len(lexical_index) else None
+            self._lexical_index_version = index_version
+
+    def _refresh_flat_index(self, index_version: str) -> None:
+        """Map the flat export taken at index_version; queries fall back to Chroma without one."""
+        if RETRIEVAL_BACKEND != "flat" or index_version == self._flat_index_version:
+            return
+        with self._index_lock:
+            if index_version == self._flat_index_version:
+                return
+            index_dir = flat_index_dir(self.db_path)
+            if read_flat_index_version(index_dir) != index_version:
+                # The export may still be in progress; check again on the next request
+                if self.flat_index is not None or self._flat_index_version is None:
+                    logger.warning(
+                        f"Flat index at {index_dir} is missing or stale. Using Chroma."
+                    )
+                self.flat_index = None
+                self._flat_index_version = ""
+                return
+            try:
+                self.flat_index = FlatIndex(
+                    index_dir, rerank_factor=FLAT_INDEX_RERANK_FACTOR
+                )
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Could not load flat index from {index_dir}: {e}")
+                self.flat_index = None
+                self._flat_index_version = ""
+                return
+            self._flat_index_version = index_version
+            logger.info(f"Flat index mapped from {index_dir} ({len(self.flat_index)} vectors)")
 
     def _is_thai_content(self, text: str) -> bool:
         """Check if text contains Thai characters."""
-        return bool(re.search(r"[\u0E00-\u0E7F]", str(text)))
+        return is_thai_text(text)
 
-    def _extract_and_analyze(
-        self, user_message: str, session_id: str = "default_session"
-    ) -> Dict[str, Any]:
-        """Extract intent and analyze skill gaps using LLM."""
+    def _build_analysis_chain(self) -> RunnableWithMessageHistory:
+        """Build the history-aware LLM chain that extracts intent and skill gaps."""
         parser = JsonOutputParser()
 
         prompt = ChatPromptTemplate.from_messages(
@@ -146,13 +348,15 @@ class SkillEngine:
             ]
         )
 
-        # Prevent JSON injection issues by simple bracket replacement if needed,
-        # though langchain handles most sanitization.
-        safe_message = user_message.replace("{", "(").replace("}", ")")
-
-        chain = prompt | self.llm | parser
+        # Old roadmaps would dominate the prompt, so only recent turns are replayed
+        chain = (
+            RunnablePassthrough.assign(history=RunnableLambda(self._compact_history))
+            | prompt
+            | self.llm
+            | parser
+        )
 
-        wrapped_chain = RunnableWithMessageHistory(
+        return RunnableWithMessageHistory(
             chain,
             self.get_session_history,
             input_messages_key="user_message",
@@ -160,151 +364,600 @@ class SkillEngine:
             output_messages_key="summary",
         )
 
-        return wrapped_chain.invoke(
-            {"user_message": safe_message},
+    def _chain_input(self, user_message: str) -> Dict[str, Any]:
+        # Prevent JSON injection issues by simple bracket replacement if needed,
+        # though langchain handles most sanitization.
+        safe_message = user_message.replace("{", "(").replace("}", ")")
+        return {"user_message": safe_message}
+
+    def _lookup_analysis(
+        self, chain_input: Dict[str, Any], session_id: str
+    ) -> Tuple[Optional[str], bool, Optional[Dict[str, Any]]]:
+        """Check the analysis cache; on a hit the turn is recorded in the session history."""
+        if self.analysis_cache is None:
+            return None, False, None
+
+        user_message = chain_input["user_message"]
+        history = self.get_session_history(session_id)
+        messages = history.messages
+        first_turn = not messages
+        cache_key = self.analysis_cache.make_key(user_message, messages, self.model_name)
+
+        cached = self.analysis_cache.get(cache_key, user_message, first_turn)
+        if cached is not None:
+            # Keep the history identical to what RunnableWithMessageHistory would store
+            history.add_messages(
+                [
+                    HumanMessage(content=user_message),
+                    AIMessage(content=str(cached.get("summary", ""))),
+                ]
+            )
+            self._remember_state(session_id, cached)
+        return cache_key, first_turn, cached
+
+    def _store_analysis(
+        self,
+        cache_key: Optional[str],
+        chain_input: Dict[str, Any],
+        first_turn: bool,
+        analysis_result: Any,
+    ) -> None:
+        if cache_key is None or not isinstance(analysis_result, dict):
+            return
+        self.analysis_cache.set(
+            cache_key, chain_input["user_message"], first_turn, analysis_result
+        )
+
+    def _extract_and_analyze(
+        self, user_message: str, session_id: str = "default_session"
+    ) -> Dict[str, Any]:
+        """Extract intent and analyze skill gaps using LLM."""
+        chain_input = self._chain_input(user_message)
+        cache_key, first_turn, cached = self._lookup_analysis(chain_input, session_id)
+        if cached is not None:
+            return cached
+
+        wrapped_chain = self._build_analysis_chain()
+        analysis_result = wrapped_chain.invoke(
+            chain_input,
             config={"configurable": {"session_id": session_id}},
         )
+        self._remember_state(session_id, analysis_result)
+        self._store_analysis(cache_key, chain_input, first_turn, analysis_result)
+        return analysis_result
 
-    def analyze_and_recommend(
+    def _skills_ready(
+        self, partial: Any, emitted: int, final: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Return the skills of a partial analysis that are complete and not yet emitted.
+
+        A skill is complete once the next one has started (or the stream has ended),
+        so its search terms can no longer grow.
+        """
+        skills = partial.get("missing_skills") if isinstance(partial, dict) else None
+        if not isinstance(skills, list):
+            return []
+        ready = len(skills) if final else len(skills) - 1
+        ready = min(ready, 5)
+        return [
+            item if isinstance(item, dict) else {} for item in skills[emitted:ready]
+        ]
+
+    def _extract_and_analyze_streaming(
+        self,
+        user_message: str,
+        session_id: str,
+        on_skill: Callable[[Dict[str, Any], Dict[str, Any]], None],
+    ) -> Dict[str, Any]:
+        """Stream the LLM analysis and call on_skill as soon as each missing skill is parsed.
+
+        on_skill receives the skill and the partial analysis parsed so far.
+        """
+        chain_input = self._chain_input(user_message)
+        cache_key, first_turn, cached = self._lookup_analysis(chain_input, session_id)
+
+        analysis_result: Dict[str, Any] = cached or {}
+        emitted = 0
+        if cached is None:
+            wrapped_chain = self._build_analysis_chain()
+            for partial in wrapped_chain.stream(
+                chain_input,
+                config={"configurable": {"session_id": session_id}},
+            ):
+                analysis_result = partial
+                for item in self._skills_ready(partial, emitted):
+                    on_skill(item, partial)
+                    emitted += 1
+            self._remember_state(session_id, analysis_result)
+            self._store_analysis(cache_key, chain_input, first_turn, analysis_result)
+
+        for item in self._skills_ready(analysis_result, emitted, final=True):
+            on_skill(item, analysis_result)
+        return analysis_result
+
+    async def _aextract_and_analyze(
         self, user_message: str, session_id: str = "default_session"
     ) -> Dict[str, Any]:
-        """Main entry point for analysis and course recommendation."""
-        analysis_result = self._extract_and_analyze(user_message, session_id)
-        user_lang = analysis_result.get("detected_language", "TH").upper()
+        """Async variant of _extract_and_analyze; awaits the LLM without blocking a thread."""
+        chain_input = self._chain_input(user_message)
+        cache_key, first_turn, cached = await asyncio.to_thread(
+            self._lookup_analysis, chain_input, session_id
+        )
+        if cached is not None:
+            return cached
 
-        prefer_free = analysis_result.get("preference_free", False)
+        wrapped_chain = self._build_analysis_chain()
+        analysis_result = await wrapped_chain.ainvoke(
+            chain_input,
+            config={"configurable": {"session_id": session_id}},
+        )
+        await asyncio.to_thread(self._remember_state, session_id, analysis_result)
+        await asyncio.to_thread(
+            self._store_analysis, cache_key, chain_input, first_turn, analysis_result
+        )
+        return analysis_result
 
-        missing_skills_data = analysis_result.get("missing_skills", [])[:5]
-        recommendations = []
+    def _query_vectors(
+        self,
+        query_embeddings: List[List[float]],
+        k: int,
+        where: Optional[Dict[str, Any]] = None,
+    ) -> List[List[Tuple[Document, float]]]:
+        """Run pre-computed query vectors as a single multi-query lookup."""
+        if not query_embeddings:
+            return []
 
-        if self.db:
-            for item in missing_skills_data:
-                term_en = item.get("search_term_en", "")
-                term_th = item.get("search_term_th", "")
-                display_name = item.get("display_name", term_en)
+        flat_index = self.flat_index
+        if flat_index is not None:
+            return flat_index.query(query_embeddings, k, where)
 
-                logger.debug(f"Searching: EN='{term_en}' | TH='{term_th}'")
+        response = self.db._collection.query(
+            query_embeddings=query_embeddings,
+            n_results=k,
+            where=where,
+            include=["documents", "metadatas", "distances"],
+        )
 
-                results: List[Tuple[Document, float]] = []
-                try:
-                    # similarity_search_with_score returns (Document, score) where score is distance (lower is better)
-                    if term_en:
-                        res_en = self.db.similarity_search_with_score(term_en, k=25)
-                        results.extend(res_en)
+        # Chroma returns one list per query; distance is L2 (lower is better)
+        batched_results = []
+        for ids, documents, metadatas, distances in zip(
+            response["ids"],
+            response["documents"],
+            response["metadatas"],
+            response["distances"],
+        ):
+            batched_results.append(
+                [
+                    (
+                        Document(id=doc_id, page_content=text or "", metadata=meta or {}),
+                        distance,
+                    )
+                    for doc_id, text, meta, distance in zip(
+                        ids, documents, metadatas, distances
+                    )
+                ]
+            )
+        return batched_results
 
-                    if term_th and term_th != term_en:
-                        res_th = self.db.similarity_search_with_score(term_th, k=25)
-                        results.extend(res_th)
+    def _search_batch(
+        self, queries: List[str], k: int = 25, where: Optional[Dict[str, Any]] = None
+    ) -> List[List[Tuple[Document, float]]]:
+        """Embed all queries in one pass and run them as a single multi-query lookup."""
+        if not queries:
+            return []
+        return self._query_vectors(
+            self.query_embeddings.embed_documents(queries), k, where
+        )
 
-                except Exception as e:
-                    logger.error(f"Search Error for term '{display_name}': {e}")
-                    results = []
+    def _skill_terms(self, item: Dict[str, Any]) -> List[str]:
+        """Return the distinct search terms (EN first, then TH) of one skill."""
+        term_en = item.get("search_term_en", "")
+        term_th = item.get("search_term_th", "")
+        logger.debug(f"Searching: EN='{term_en}' | TH='{term_th}'")
+
+        terms = [term_en] if term_en else []
+        if term_th and term_th != term_en:
+            terms.append(term_th)
+        return terms
+
+    def _collect_terms(
+        self, missing_skills_data: List[Dict[str, Any]]
+    ) -> Tuple[List[str], List[List[int]]]:
+        """Unique search terms of all skills, plus each skill's indices into them."""
+        unique_terms: List[str] = []
+        term_index: Dict[str, int] = {}
+        skill_terms: List[List[int]] = []
+
+        for item in missing_skills_data:
+            indices = []
+            for term in self._skill_terms(item):
+                if term not in term_index:
+                    term_index[term] = len(unique_terms)
+                    unique_terms.append(term)
+                indices.append(term_index[term])
+            skill_terms.append(indices)
+        return unique_terms, skill_terms
+
+    def _retrieve_for_skills(
+        self,
+        missing_skills_data: List[Dict[str, Any]],
+        user_lang: Optional[str] = None,
+        prefer_free: bool = False,
+    ) -> List[Optional[List[Tuple[Document, float]]]]:
+        """Run the EN/TH lookups of every skill as one batch and fan results back out per skill.
+
+        With the user's preferences and a store that has the ranking flags, only the
+        needed buckets are queried (see _retrieve_filtered). If the batch fails, each
+        skill is searched on its own so one bad term only costs its own skill (None).
+        """
+        unique_terms, skill_terms = self._collect_terms(missing_skills_data)
+        if not unique_terms:
+            return [[] for _ in missing_skills_data]
+
+        try:
+            if self.filtered_search and user_lang is not None:
+                per_skill_results = self._retrieve_filtered(
+                    unique_terms, skill_terms, user_lang, prefer_free
+                )
+            else:
+                term_results = self._search_batch(unique_terms, k=25)
+                per_skill_results = []
+                for indices in skill_terms:
+                    results: List[Tuple[Document, float]] = []
+                    for idx in indices:
+                        results.extend(term_results[idx])
+                    per_skill_results.append(results)
+
+            lexical_index = self.lexical_index
+            if lexical_index is not None:
+                per_skill_results = self._fuse_lexical(
+                    lexical_index, unique_terms, skill_terms, per_skill_results
+                )
+        except Exception as e:
+            if len(missing_skills_data) == 1:
+                logger.error(f"Search Error for terms {unique_terms}: {e}")
+                return [None]
+            logger.warning(f"Batched search failed ({e}); retrying skills one by one")
+            return [
+                self._retrieve_for_skills([item], user_lang, prefer_free)[0]
+                for item in missing_skills_data
+            ]
+        return per_skill_results
+
+    def _fetch_by_ids(self, ids: List[str]) -> Dict[str, Tuple[Document, np.ndarray]]:
+        """Stored document and embedding of each id (missing ids are left out)."""
+        if not ids:
+            return {}
+        flat_index = self.flat_index
+        if flat_index is not None:
+            return flat_index.get(ids)
+        response = self.db._collection.get(
+            ids=ids, include=["embeddings", "documents", "metadatas"]
+        )
+        return {
+            doc_id: (
+                Document(id=doc_id, page_content=text or "", metadata=meta or {}),
+                np.asarray(embedding, dtype=np.float32),
+            )
+            for doc_id, text, meta, embedding in zip(
+                response["ids"],
+                response["documents"],
+                response["metadatas"],
+                response["embeddings"],
+            )
+        }
+
+    def _fuse_lexical(
+        self,
+        lexical_index: LexicalIndex,
+        unique_terms: List[str],
+        skill_terms: List[List[int]],
+        per_skill_results: List[List[Tuple[Document, float]]],
+    ) -> List[List[Tuple[Document, float]]]:
+        """Merge BM25 hits into each skill's vector results by reciprocal rank fusion.
 
-                # Deduplicate results by URL, keeping the lowest score (best match)
-                unique_results: Dict[str, Tuple[Document, float]] = {}
-                for doc, score in results:
-                    url = doc.metadata.get("url")
-                    if url not in unique_results or score < unique_results[url][1]:
-                        unique_results[url] = (doc, score)
+        The output is in fused order. Every candidate keeps its real L2 distance to
+        the closest of the skill's terms, so the score threshold applies unchanged.
+        """
+        term_hits = [
+            [doc_id for doc_id, _ in lexical_index.search(term, LEXICAL_SEARCH_K)]
+            for term in unique_terms
+        ]
 
-                final_results = list(unique_results.values())
+        # Lexical hits the vector search did not return for that skill need their vectors
+        missing = set()
+        for indices, results in zip(skill_terms, per_skill_results):
+            found = {doc.id for doc, _ in results}
+            missing.update(
+                doc_id for t in indices for doc_id in term_hits[t] if doc_id not in found
+            )
+        fetched = self._fetch_by_ids(sorted(missing))
+        query_vectors = (
+            np.asarray(
+                self.query_embeddings.embed_documents(unique_terms), dtype=np.float32
+            )
+            if fetched
+            else None
+        )
 
-                free_courses = []
-                thai_courses = []
-                other_courses = []
+        fused_results = []
+        for indices, results in zip(skill_terms, per_skill_results):
+            candidates: Dict[str, Tuple[Document, float]] = {}
+            for doc, distance in results:
+                if doc.id not in candidates or distance < candidates[doc.id][1]:
+                    candidates[doc.id] = (doc, distance)
+            vector_ranking = sorted(candidates, key=lambda doc_id: candidates[doc_id][1])
 
-                for doc, score in final_results:
-                    # Filter out poor matches (arbitrary threshold, kept from original code)
-                    if score > 20.0:
+            for t in indices:
+                for doc_id in term_hits[t]:
+                    if doc_id in candidates or doc_id not in fetched:
                         continue
+                    doc, embedding = fetched[doc_id]
+                    diff = query_vectors[indices] - embedding
+                    candidates[doc_id] = (doc, float(np.einsum("ij,ij->i", diff, diff).min()))
+
+            fused = reciprocal_rank_fusion(
+                [vector_ranking] + [term_hits[t] for t in indices], k=RRF_K
+            )
+            ordered = sorted(
+                candidates,
+                key=lambda doc_id: (-fused.get(doc_id, 0.0), candidates[doc_id][1]),
+            )
+            fused_results.append([candidates[doc_id] for doc_id in ordered])
+        return fused_results
+
+    def _bucket_plan(
+        self, user_lang: str, prefer_free: bool
+    ) -> Tuple[List[int], List[int]]:
+        """Primary bucket and the fallback buckets used to fill up, as in rank_candidates."""
+        if prefer_free:
+            return [BUCKET_FREE], [BUCKET_THAI if user_lang == "TH" else BUCKET_OTHER]
+        if user_lang == "TH":
+            return [BUCKET_THAI], [BUCKET_OTHER, BUCKET_FREE]
+        return [BUCKET_OTHER], [BUCKET_FREE, BUCKET_THAI]
+
+    def _good_matches(self, results: List[Tuple[Document, float]]) -> int:
+        """Number of distinct courses within the score threshold."""
+        return len(
+            {
+                doc.metadata.get("url")
+                for doc, score in results
+                if score <= SCORE_THRESHOLD
+            }
+        )
+
+    def _retrieve_filtered(
+        self,
+        unique_terms: List[str],
+        skill_terms: List[List[int]],
+        user_lang: str,
+        prefer_free: bool,
+    ) -> List[List[Tuple[Document, float]]]:
+        """Targeted lookups: the primary bucket first, fallback buckets only if it runs short."""
+        query_embeddings = self.query_embeddings.embed_documents(unique_terms)
+        per_skill_results: List[List[Tuple[Document, float]]] = [
+            [] for _ in skill_terms
+        ]
+
+        for buckets in self._bucket_plan(user_lang, prefer_free):
+            needed = {
+                i: COURSES_PER_SKILL - self._good_matches(results)
+                for i, results in enumerate(per_skill_results)
+            }
+            todo = [i for i, count in needed.items() if count > 0 and skill_terms[i]]
+            if not todo:
+                break
+
+            found = self._search_bucket(
+                query_embeddings, skill_terms, todo, needed, bucket_filter(buckets)
+            )
+            for i in todo:
+                per_skill_results[i].extend(found[i])
+
+        return per_skill_results
+
+    def _search_bucket(
+        self,
+        query_embeddings: List[List[float]],
+        skill_terms: List[List[int]],
+        todo: List[int],
+        needed: Dict[int, int],
+        where: Dict[str, Any],
+    ) -> Dict[int, List[Tuple[Document, float]]]:
+        """Query one bucket, widening k only for skills that still lack good matches."""
+        found: Dict[int, List[Tuple[Document, float]]] = {i: [] for i in todo}
+        active = list(todo)
+        k = FILTERED_SEARCH_K
+
+        while active:
+            term_ids = sorted({t for i in active for t in skill_terms[i]})
+            term_results = dict(
+                zip(
+                    term_ids,
+                    self._query_vectors(
+                        [query_embeddings[t] for t in term_ids], k, where
+                    ),
+                )
+            )
+
+            next_active = []
+            for i in active:
+                found[i] = [pair for t in skill_terms[i] for pair in term_results[t]]
+                if self._good_matches(found[i]) >= needed[i]:
+                    continue
+                # More candidates can only exist if a full page still ended within the threshold
+                may_have_more = any(
+                    len(term_results[t]) == k and term_results[t][-1][1] <= SCORE_THRESHOLD
+                    for t in skill_terms[i]
+                )
+                if may_have_more and k < FILTERED_SEARCH_MAX_K:
+                    next_active.append(i)
+
+            active = next_active
+            k = min(k * 2, FILTERED_SEARCH_MAX_K)
+
+        return found
+
+    def _search_skill(
+        self,
+        item: Dict[str, Any],
+        user_lang: Optional[str] = None,
+        prefer_free: bool = False,
+    ) -> Optional[List[Tuple[Document, float]]]:
+        """Retrieve the candidates of a single skill (its EN/TH terms in one batch)."""
+        return self._retrieve_for_skills([item], user_lang, prefer_free)[0]
+
+    def _recommendation_key(
+        self,
+        item: Dict[str, Any],
+        user_lang: str,
+        prefer_free: bool,
+        index_version: str,
+    ) -> Tuple[str, str, str, bool, str]:
+        return (
+            normalize_term(item.get("search_term_en", "")),
+            normalize_term(item.get("search_term_th", "")),
+            user_lang,
+            bool(prefer_free),
+            index_version,
+        )
+
+    def _cached_courses(
+        self,
+        item: Dict[str, Any],
+        user_lang: str,
+        prefer_free: bool,
+        index_version: str,
+    ) -> Optional[List[Dict[str, Any]]]:
+        courses = self.recommendation_cache.get(
+            self._recommendation_key(item, user_lang, prefer_free, index_version)
+        )
+        return copy.deepcopy(courses) if courses is not None else None
+
+    def _course_data(self, doc: Document, score: float) -> Dict[str, Any]:
+        metadata = doc.metadata
+        # Durations are cleaned at ingestion; older stores still need the rewrite
+        if has_precomputed_attributes(metadata):
+            display_duration = metadata.get("duration", "")
+        else:
+            display_duration = clean_duration(metadata.get("duration", ""))
+
+        return {
+            "title": metadata.get("title"),
+            "url": metadata.get("url"),
+            "level": metadata.get("level"),
+            "price": metadata.get("price", "Unknown"),
+            "category": metadata.get("category", "General"),
+            "duration": display_duration,
+            "image_url": metadata.get("image_url", ""),
+            "source": metadata.get("source", ""),
+            "score": score,
+        }
+
+    def _rank_skills(
+        self,
+        items: List[Dict[str, Any]],
+        per_skill_results: List[Optional[List[Tuple[Document, float]]]],
+        user_lang: str,
+        prefer_free: bool,
+        index_version: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Rank the candidates of all skills in one columnar pass and build their entries."""
+        picks = rank_candidates(
+            [results or [] for results in per_skill_results],
+            user_lang,
+            prefer_free,
+            k=COURSES_PER_SKILL,
+            threshold=SCORE_THRESHOLD,
+            # Fused results arrive in rank order; plain vector results rank by distance
+            by_position=self.lexical_index is not None,
+        )
+
+        recommendations = []
+        for item, results, picked in zip(items, per_skill_results, picks):
+            # Course dicts are only built for the final picks
+            best_courses = [self._course_data(doc, score) for doc, score in picked]
+
+            # Failed searches are not cached, so the next request retries them
+            if index_version is not None and results is not None:
+                self.recommendation_cache.set(
+                    self._recommendation_key(
+                        item, user_lang, prefer_free, index_version
+                    ),
+                    copy.deepcopy(best_courses),
+                )
+            recommendations.append(self._skill_recommendation(item, best_courses))
+        return recommendations
+
+    def _skill_recommendation(
+        self, item: Dict[str, Any], best_courses: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        term_en = item.get("search_term_en", "")
+        display_name = item.get("display_name", term_en)
+
+        # Fallback if no courses found
+        if not best_courses:
+            encoded_query = term_en.replace(" ", "%20")
+            best_courses = [
+                {
+                    "title": f"Search '{display_name}' on Google",
+                    "url": f"https://www.google.com/search?q={encoded_query}+course",
+                    "level": "External Search",
+                    "duration": "-",
+                    "score": 0,
+                    "image_url": "",
+                }
+            ]
+
+        return {"skill_gap": display_name, "suggested_courses": best_courses}
+
+    def _preferences(self, analysis_result: Dict[str, Any]) -> Tuple[str, bool]:
+        user_lang = str(analysis_result.get("detected_language") or "TH").upper()
+        prefer_free = analysis_result.get("preference_free", False)
+        return user_lang, prefer_free
 
-                    # Log successful finds at debug level
-                    # logger.debug(f"Found: [{score:.4f}] {doc.metadata.get('title')}")
-
-                    raw_duration = str(doc.metadata.get("duration", ""))
-                    if raw_duration.lower() == "nan" or not raw_duration:
-                        display_duration = "Self-paced"
-                    else:
-                        display_duration = raw_duration
-
-                    course_data = {
-                        "title": doc.metadata.get("title"),
-                        "url": doc.metadata.get("url"),
-                        "level": doc.metadata.get("level"),
-                        "price": doc.metadata.get("price", "Unknown"),
-                        "category": doc.metadata.get("category", "General"),
-                        "duration": display_duration,
-                        "image_url": doc.metadata.get("image_url", ""),
-                        "source": doc.metadata.get("source", ""),
-                        "score": score,
-                    }
-
-                    source = course_data["source"]
-                    title = course_data["title"]
-                    price = str(course_data["price"]).lower()
-
-                    if source == "Khan Academy" or "free" in price:
-                        free_courses.append(course_data)
-                    elif source in [
-                        "SkillLane",
-                        "FutureSkill",
-                    ] or self._is_thai_content(title):
-                        thai_courses.append(course_data)
-                    else:
-                        other_courses.append(course_data)
-
-                # Selection Logic
-                final_selection = []
-
-                free_courses.sort(key=lambda x: x["score"])
-                thai_courses.sort(key=lambda x: x["score"])
-                other_courses.sort(key=lambda x: x["score"])
-
-                if prefer_free:
-                    final_selection.extend(free_courses)
-                    if len(final_selection) < 2:
-                        needed = 2 - len(final_selection)
-                        if user_lang == "TH":
-                            final_selection.extend(thai_courses[:needed])
-                        else:
-                            final_selection.extend(other_courses[:needed])
-
-                else:
-                    if user_lang == "TH":
-                        final_selection.extend(thai_courses)
-                        if len(final_selection) < 2:
-                            needed = 2 - len(final_selection)
-                            inter_mix = other_courses + free_courses
-                            inter_mix.sort(key=lambda x: x["score"])
-                            final_selection.extend(inter_mix[:needed])
-                    else:
-                        final_selection.extend(other_courses)
-                        if len(final_selection) < 2:
-                            needed = 2 - len(final_selection)
-                            inter_mix = free_courses + thai_courses
-                            inter_mix.sort(key=lambda x: x["score"])
-                            final_selection.extend(inter_mix[:needed])
-
-                best_courses = final_selection[:2]
-
-                # Fallback if no courses found
-                if not best_courses:
-                    encoded_query = term_en.replace(" ", "%20")
-                    best_courses = [
-                        {
-                            "title": f"Search '{display_name}' on Google",
-                            "url": f"https://www.google.com/search?q={encoded_query}+course",
-                            "level": "External Search",
-                            "duration": "-",
-                            "score": 0,
-                            "image_url": "",
-                        }
-                    ]
-
-                recommendations.append(
-                    {"skill_gap": display_name, "suggested_courses": best_courses}
+    def _recommend(self, analysis_result: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Retrieve and rank courses for the missing skills of an analysis result."""
+        user_lang, prefer_free = self._preferences(analysis_result)
+
+        missing_skills_data = analysis_result.get("missing_skills", [])[:5]
+        if not self.db:
+            return []
+
+        # Skills ranked before against the same index version skip vector search
+        index_version = self._current_index_version()
+        recommendations: List[Optional[Dict[str, Any]]] = []
+        pending: List[int] = []
+        for i, item in enumerate(missing_skills_data):
+            courses = self._cached_courses(item, user_lang, prefer_free, index_version)
+            if courses is None:
+                pending.append(i)
+                recommendations.append(None)
+            else:
+                recommendations.append(self._skill_recommendation(item, courses))
+
+        todo = [missing_skills_data[i] for i in pending]
+        if self.executor and len(todo) > 1:
+            # executor.map keeps the input order, so output matches the sequential path
+            per_skill_results = list(
+                self.executor.map(
+                    lambda item: self._search_skill(item, user_lang, prefer_free),
+                    todo,
                 )
+            )
+        else:
+            per_skill_results = self._retrieve_for_skills(todo, user_lang, prefer_free)
+        ranked = self._rank_skills(
+            todo, per_skill_results, user_lang, prefer_free, index_version
+        )
+
+        for i, recommendation in zip(pending, ranked):
+            recommendations[i] = recommendation
+        return recommendations
 
+    def _build_response(
+        self, analysis_result: Dict[str, Any], recommendations: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
         return {
             "user_intent": {
                 "detected_current_role": analysis_result.get("current_role"),
@@ -314,6 +967,166 @@ class SkillEngine:
             "recommendations": recommendations,
         }
 
+    def _rank_streamed(
+        self,
+        analysis_result: Dict[str, Any],
+        searched: List[
+            Tuple[Dict[str, Any], Optional[List[Tuple[Document, float]]], Tuple[str, bool]]
+        ],
+        index_version: str,
+    ) -> List[Dict[str, Any]]:
+        """Rank skills whose candidates were retrieved (or found cached) during streaming."""
+        user_lang, prefer_free = self._preferences(analysis_result)
+        recommendations: List[Optional[Dict[str, Any]]] = []
+        to_rank: List[int] = []
+        to_rank_results: List[Optional[List[Tuple[Document, float]]]] = []
+        for i, (item, results, searched_with) in enumerate(searched):
+            courses = self._cached_courses(item, user_lang, prefer_free, index_version)
+            if courses is not None:
+                recommendations.append(self._skill_recommendation(item, courses))
+                continue
+
+            # Skipped as cached under the partial preferences, failed, or filtered
+            # for preferences that changed by the end of the stream: search now
+            stale = self.filtered_search and searched_with != (user_lang, prefer_free)
+            if results is None or stale:
+                results = self._search_skill(item, user_lang, prefer_free)
+            recommendations.append(None)
+            to_rank.append(i)
+            to_rank_results.append(results)
+
+        ranked = self._rank_skills(
+            [searched[i][0] for i in to_rank],
+            to_rank_results,
+            user_lang,
+            prefer_free,
+            index_version,
+        )
+        for i, recommendation in zip(to_rank, ranked):
+            recommendations[i] = recommendation
+        return recommendations
+
+    def _is_cached_while_streaming(
+        self, item: Dict[str, Any], partial: Dict[str, Any], index_version: str
+    ) -> bool:
+        # detected_language and preference_free precede missing_skills in the JSON
+        user_lang, prefer_free = self._preferences(partial)
+        return (
+            self._cached_courses(item, user_lang, prefer_free, index_version)
+            is not None
+        )
+
+    def _analyze_streaming(
+        self, user_message: str, session_id: str
+    ) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """Overlap vector search with LLM generation, one search per parsed skill."""
+        index_version = self._current_index_version()
+        pending: List[Tuple[Dict[str, Any], Optional[Future], Tuple[str, bool]]] = []
+
+        def submit(item: Dict[str, Any], partial: Dict[str, Any]) -> None:
+            if not self.db:
+                return
+            preferences = self._preferences(partial)
+            if self._is_cached_while_streaming(item, partial, index_version):
+                pending.append((item, None, preferences))
+            else:
+                future = self.executor.submit(self._search_skill, item, *preferences)
+                pending.append((item, future, preferences))
+
+        analysis_result = self._extract_and_analyze_streaming(
+            user_message, session_id, submit
+        )
+        searched = [
+            (item, future.result() if future else None, preferences)
+            for item, future, preferences in pending
+        ]
+        recommendations = self._rank_streamed(analysis_result, searched, index_version)
+        return analysis_result, recommendations
+
+    def analyze_and_recommend(
+        self, user_message: str, session_id: str = "default_session"
+    ) -> Dict[str, Any]:
+        """Main entry point for analysis and course recommendation."""
+        if self.stream_analysis:
+            analysis_result, recommendations = self._analyze_streaming(
+                user_message, session_id
+            )
+            return self._build_response(analysis_result, recommendations)
+
+        analysis_result = self._extract_and_analyze(user_message, session_id)
+        recommendations = self._recommend(analysis_result)
+        return self._build_response(analysis_result, recommendations)
+
+    async def _aanalyze_streaming(
+        self, user_message: str, session_id: str
+    ) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """Async variant of _analyze_streaming built on astream."""
+        chain_input = self._chain_input(user_message)
+        cache_key, first_turn, cached = await asyncio.to_thread(
+            self._lookup_analysis, chain_input, session_id
+        )
+        # A reload reads the whole lexical store, which would stall every other session
+        index_version = await asyncio.to_thread(self._current_index_version)
+        pending: List[
+            Tuple[Dict[str, Any], Optional[asyncio.Task], Tuple[str, bool]]
+        ] = []
+
+        def submit(item: Dict[str, Any], partial: Dict[str, Any]) -> None:
+            if not self.db:
+                return
+            preferences = self._preferences(partial)
+            if self._is_cached_while_streaming(item, partial, index_version):
+                pending.append((item, None, preferences))
+            else:
+                task = asyncio.create_task(
+                    asyncio.to_thread(self._search_skill, item, *preferences)
+                )
+                pending.append((item, task, preferences))
+
+        analysis_result: Dict[str, Any] = cached or {}
+        emitted = 0
+        if cached is None:
+            wrapped_chain = self._build_analysis_chain()
+            async for partial in wrapped_chain.astream(
+                chain_input,
+                config={"configurable": {"session_id": session_id}},
+            ):
+                analysis_result = partial
+                for item in self._skills_ready(partial, emitted):
+                    submit(item, partial)
+                    emitted += 1
+            await asyncio.to_thread(self._remember_state, session_id, analysis_result)
+            await asyncio.to_thread(
+                self._store_analysis, cache_key, chain_input, first_turn, analysis_result
+            )
+
+        for item in self._skills_ready(analysis_result, emitted, final=True):
+            submit(item, analysis_result)
+
+        searched = [
+            (item, await task if task else None, preferences)
+            for item, task, preferences in pending
+        ]
+        recommendations = await asyncio.to_thread(
+            self._rank_streamed, analysis_result, searched, index_version
+        )
+        return analysis_result, recommendations
+
+    async def aanalyze_and_recommend(
+        self, user_message: str, session_id: str = "default_session"
+    ) -> Dict[str, Any]:
+        """Async entry point: awaits the LLM and runs retrieval off the event loop."""
+        if self.stream_analysis:
+            analysis_result, recommendations = await self._aanalyze_streaming(
+                user_message, session_id
+            )
+            return self._build_response(analysis_result, recommendations)
+
+        analysis_result = await self._aextract_and_analyze(user_message, session_id)
+        # Embedding and vector search are CPU/IO bound sync calls, keep them off the loop
+        recommendations = await asyncio.to_thread(self._recommend, analysis_result)
+        return self._build_response(analysis_result, recommendations)
+
 
 if __name__ == "__main__":
     try:
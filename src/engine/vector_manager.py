@@ -1,56 +1,263 @@
-import pandas as pd
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
 from langchain_core.documents import Document
 import os
 import hashlib
 import shutil
-from typing import List, Dict, Any
+import time
+from contextlib import ExitStack, closing
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from src.config import (
-    DATA_DIR, VECTOR_STORE_DIR, EMBEDDING_MODEL_NAME
+    DATA_DIR, VECTOR_STORE_DIR, FLAT_INDEX_EXPORT, FLAT_INDEX_DTYPE, DOCUMENT_EMBEDDING_CACHE_PATH,
+    INGEST_CHUNK_SIZE
+)
+from src.engine.bulk_embedding import (
+    INITIAL_BATCH_SIZE,
+    BulkEmbedder,
+    max_upsert_batch,
+    tune_batch_size,
+)
+from src.engine.catalog_store import INGEST_COLUMNS, catalog_path, iter_catalog
+from src.engine.course_attributes import (
+    ATTRIBUTES_VERSION,
+    clean_duration,
+    compute_course_attributes,
+)
+from src.engine.embedding_backend import embedding_fingerprint, get_embedding_model
+from src.engine.embedding_cache import SQLiteEmbeddingStore, model_fingerprint
+from src.engine.flat_index import export_flat_index, flat_index_dir, read_flat_index_version
+from src.engine.index_manifest import MANIFEST_FILE, IndexManifest, load_existing_entries
+from src.engine.index_meta import bump_index_version, read_index_version
+from src.engine.lexical_index import (
+    LEXICAL_INDEX_FILE,
+    TOKENIZER,
+    LexicalIndexStore,
+    course_search_text,
 )
 from src.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Metadata-only updates written per Chroma call
+REFRESH_BATCH_SIZE = 4000
+
 def generate_hash(text: str) -> str:
     return hashlib.md5(text.encode('utf-8')).hexdigest()
 
+def embed_with_cache(
+    embedder: BulkEmbedder,
+    cache: Optional[SQLiteEmbeddingStore],
+    keys: List[str],
+    texts: List[str],
+) -> Tuple[List[List[float]], int, float]:
+    """Vectors for texts, embedding only keys missing from the cache.
+
+    Returns (vectors, reused, seconds): seconds covers only the texts actually
+    embedded (len(keys) - reused), not cache lookups or writes.
+    """
+    vectors = cache.get_many(keys) if cache is not None else {}
+    to_embed: Dict[str, str] = {}
+    for key, text in zip(keys, texts):
+        if key not in vectors and key not in to_embed:
+            to_embed[key] = text
+    seconds = 0.0
+    if to_embed:
+        started = time.perf_counter()
+        embedded = embedder.embed(list(to_embed.values()))
+        seconds = time.perf_counter() - started
+        fresh = dict(zip(to_embed.keys(), embedded))
+        if cache is not None:
+            cache.put_many(fresh)
+        vectors.update(fresh)
+    return [vectors[key] for key in keys], len(keys) - len(to_embed), seconds
+
+# Map source name to catalog file name (data/<name>.parquet, or a legacy .csv)
+DATA_SOURCES = {
+    "Coursera": "coursera_dataset",
+    "FutureSkill": "futureskill_dataset",
+    "DataCamp": "datacamp_dataset",
+    "Khan Academy": "khan_dataset"
+}
+
+def iter_source_chunks(
+    chunk_size: int = INGEST_CHUNK_SIZE, failed_sources: Optional[List[str]] = None
+) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    """Yield (source name, records) chunks, reading only the columns ingestion uses.
+
+    A source that fails to load is logged, added to failed_sources and skipped.
+    """
+    for source_name, name in DATA_SOURCES.items():
+        file_path = catalog_path(name, DATA_DIR)
+        if not file_path.exists():
+            logger.debug(f"Data file for {source_name} not found at {file_path}")
+            continue
+
+        try:
+            for records in iter_catalog(file_path, INGEST_COLUMNS, chunk_size):
+                yield source_name, records
+        except Exception as e:
+            logger.error(f"Error loading {source_name}: {e}")
+            if failed_sources is not None:
+                failed_sources.append(source_name)
+
 def load_all_data_sources() -> List[Dict[str, Any]]:
     all_items = []
-    
-    # Map source name to filename
-    sources = {
-        "Coursera": "coursera_dataset.csv",
-        "FutureSkill": "futureskill_dataset.csv",
-        "DataCamp": "datacamp_dataset.csv",
-        "Khan Academy": "khan_dataset.csv"
+    for _, records in iter_source_chunks():
+        all_items.extend(records)
+    return all_items
+
+def build_course_document(doc_id: str, item: Dict[str, Any]) -> Tuple[Document, str]:
+    """Return the document to embed and the lexical search text of one catalog record."""
+    content = f"""
+        Title: {item.get('title', '')}
+        Description: {item.get('description', '')}
+        Level: {item.get('level', '')}
+        Category: {item.get('category', '')}
+        """
+    clean_content = content.strip()
+    current_hash = generate_hash(clean_content)
+
+    metadata = {
+        "id": doc_id,
+        "title": str(item.get('title', '')),
+        "url": str(item.get('url', '')),
+        "level": str(item.get('level', '')),
+        "category": str(item.get('category', '')),
+        "image_url": str(item.get('image_url', '')),
+        "duration": clean_duration(item.get('duration', '')),
+        "price": str(item.get('price', 'Unknown')),
+        "source": str(item.get('source', 'Unknown')),
+        "content_hash": current_hash 
     }
+    # Ranking flags computed once here instead of on every query
+    metadata.update(compute_course_attributes(
+        metadata["source"], metadata["title"], metadata["price"], item.get('duration', '')
+    ))
+    search_text = course_search_text(
+        item.get('title', ''), item.get('category', ''), item.get('description', '')
+    )
+    return Document(page_content=clean_content, metadata=metadata), search_text
 
-    for source_name, filename in sources.items():
-        file_path = DATA_DIR / filename
-        if file_path.exists():
-            try:
-                df = pd.read_csv(file_path)
-                # Handle NaNs in image_url
-                if 'image_url' in df.columns:
-                    df['image_url'] = df['image_url'].fillna('')
-                else:
-                    df['image_url'] = ''
-                    
-                records = df.to_dict('records')
-                # Inject source if missing? Original code didn't seem to explicitly force it if CSV has it.
-                # Assuming CSV has 'source' column or logic handles it.
-                
-                all_items.extend(records)
-                logger.info(f"Loaded {len(records)} items from {source_name}")
-            except Exception as e:
-                logger.error(f"Error loading {source_name}: {e}")
-        else:
-             logger.debug(f"Data file for {source_name} not found at {file_path}")
+class CatalogWriter:
+    """Buffers changed documents and writes them in bounded batches.
 
-    return all_items
+    Each batch is embedded (content-hash cache first, then the worker pool),
+    upserted into Chroma and recorded in the manifest and lexical index, so at
+    most one batch of documents and vectors is held in memory.
+    """
+
+    def __init__(self, db: Chroma, embedding_model: Any, manifest: IndexManifest, lexical_store: LexicalIndexStore):
+        self.db = db
+        self.manifest = manifest
+        self.lexical_store = lexical_store
+        self.embedder = BulkEmbedder(embedding_model)
+        # Vectors of previously embedded text are reused whatever the document ID
+        self.vector_cache = (
+            SQLiteEmbeddingStore(DOCUMENT_EMBEDDING_CACHE_PATH)
+            if DOCUMENT_EMBEDDING_CACHE_PATH
+            else None
+        )
+        self.fingerprint = model_fingerprint(embedding_fingerprint())
+
+        # Embedding batch size follows measured throughput
+        self.upsert_limit = max_upsert_batch(db)
+        self.batch_size = min(INITIAL_BATCH_SIZE, self.upsert_limit or INITIAL_BATCH_SIZE)
+        self.pending: List[Tuple[str, Document, str]] = []
+        self.pending_refresh: List[Tuple[str, Dict[str, Any]]] = []
+
+        self.upserted = 0
+        self.refreshed = 0
+        self.reused = 0
+        self.batches = 0
+
+    def add(self, doc_id: str, doc: Document, search_text: str) -> None:
+        self.pending.append((doc_id, doc, search_text))
+        if len(self.pending) >= self.batch_size:
+            self.flush_upserts()
+
+    def refresh(self, doc_id: str, metadata: Dict[str, Any]) -> None:
+        """Queue a metadata-only update (unchanged content, outdated ranking attributes)."""
+        self.pending_refresh.append((doc_id, metadata))
+        if len(self.pending_refresh) >= REFRESH_BATCH_SIZE:
+            self.flush_refreshes()
+
+    def flush_upserts(self) -> None:
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        batch_ids = [doc_id for doc_id, _, _ in batch]
+        batch_texts = [doc.page_content for _, doc, _ in batch]
+        batch_metas = [doc.metadata for _, doc, _ in batch]
+        self.batches += 1
+
+        logger.info(f"   Upserting batch {self.batches} ({len(batch)} items, {self.upserted} done)...")
+        pool_was_running = self.embedder.pool_running
+        vectors, batch_reused, embed_seconds = embed_with_cache(
+            self.embedder,
+            self.vector_cache,
+            [f"{self.fingerprint}:{meta['content_hash']}" for meta in batch_metas],
+            batch_texts,
+        )
+        self.db._collection.upsert(
+            ids=batch_ids,
+            embeddings=vectors,
+            documents=batch_texts,
+            metadatas=batch_metas,
+        )
+        self.manifest.upsert(batch_ids, batch_metas)
+        self.lexical_store.update({doc_id: text for doc_id, _, text in batch}, [])
+
+        self.upserted += len(batch)
+        self.reused += batch_reused
+        # Throughput counts only texts that were embedded. The batch that starts the
+        # worker pool also pays for spawning the processes and loading the model in
+        # each; timing it would collapse the batch size
+        # A mostly cached batch says little about embedding speed, so it is not used
+        embedded = len(batch) - batch_reused
+        if 2 * embedded >= len(batch) and (pool_was_running or not self.embedder.pool_running):
+            self.batch_size = tune_batch_size(
+                embedded / max(embed_seconds, 1e-6),
+                len(vectors[0]) if vectors else 0,
+                sum(len(text.encode('utf-8')) for text in batch_texts) / len(batch_texts),
+                self.upsert_limit,
+                self.embedder.pending_worker_memory,
+            )
+
+    def flush_refreshes(self) -> None:
+        if not self.pending_refresh:
+            return
+        batch, self.pending_refresh = self.pending_refresh, []
+        ids = [doc_id for doc_id, _ in batch]
+        metadatas = [meta for _, meta in batch]
+        self.db._collection.update(ids=ids, metadatas=metadatas)
+        self.manifest.upsert(ids, metadatas)
+        self.refreshed += len(batch)
+
+    def finish(self) -> None:
+        """Write the batches still buffered."""
+        self.flush_upserts()
+        self.flush_refreshes()
+
+    def close(self) -> None:
+        """Stop the worker pool and close the vector cache; buffered items are dropped."""
+        self.embedder.close()
+        if self.vector_cache is not None:
+            self.vector_cache.close()
+
+def prune_vector_cache(manifest: IndexManifest) -> None:
+    """Drop cached vectors of content no document in the manifest still has."""
+    if not DOCUMENT_EMBEDDING_CACHE_PATH:
+        return
+    fingerprint = model_fingerprint(embedding_fingerprint())
+    keep = {f"{fingerprint}:{content_hash}" for content_hash, _ in manifest.entries().values()}
+    cache = SQLiteEmbeddingStore(DOCUMENT_EMBEDDING_CACHE_PATH)
+    try:
+        removed = cache.retain(keep)
+    finally:
+        cache.close()
+    if removed:
+        logger.info(f"Pruned {removed} cached vectors no longer in the index.")
 
 def update_database_incremental():
     logger.info("="*50)
@@ -58,98 +265,118 @@ def update_database_incremental():
     logger.info("="*50)
 
     db_path = str(VECTOR_STORE_DIR)
-    embedding_model = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+    embedding_model = get_embedding_model()
     
     # Chroma checks if dir exists
     db = Chroma(persist_directory=db_path, embedding_function=embedding_model)
-    
-    incoming_data = load_all_data_sources()
-    if not incoming_data:
-        logger.warning("No data found in CSV files. Aborting.")
-        return
 
-    logger.info("Reading existing database...")
-    existing_data = db.get() 
-    existing_ids = set(existing_data['ids'])
-    
-    existing_hashes = {}
-    if existing_data['ids'] and existing_data['metadatas']:
-        for id_, meta in zip(existing_data['ids'], existing_data['metadatas']):
-            if meta:
-                existing_hashes[id_] = meta.get('content_hash', '')
-        
-    docs_to_add = []      
-    ids_to_add = []       
-    ids_seen_in_source = set() 
-
-    logger.info("Analyzing differences (Delta Check)...")
-
-    for item in incoming_data:
-        doc_id = str(item.get('id', 'unknown'))
-        
-        # Simple dedupe in source
-        if doc_id in ids_seen_in_source:
-            continue
-        ids_seen_in_source.add(doc_id)
-        
-        content = f"""
-        Title: {item.get('title', '')}
-        Description: {item.get('description', '')}
-        Level: {item.get('level', '')}
-        Category: {item.get('category', '')}
-        """
-        clean_content = content.strip()
-        current_hash = generate_hash(clean_content)
-        
-        metadata = {
-            "id": doc_id,
-            "title": str(item.get('title', '')),
-            "url": str(item.get('url', '')),
-            "level": str(item.get('level', '')),
-            "category": str(item.get('category', '')),
-            "image_url": str(item.get('image_url', '')),
-            "duration": str(item.get('duration', '')),
-            "source": str(item.get('source', 'Unknown')),
-            "content_hash": current_hash 
-        }
-
-        should_update = False
-        
-        if doc_id not in existing_ids:
-            should_update = True
-        elif existing_hashes.get(doc_id) != current_hash:
-            logger.debug(f"Draft update found for: {item.get('title')}")
-            should_update = True
-
-        if should_update:
-            doc = Document(page_content=clean_content, metadata=metadata)
-            docs_to_add.append(doc)
-            ids_to_add.append(doc_id)
-
-    ids_to_delete = list(existing_ids - ids_seen_in_source)
-    
-    if ids_to_delete:
-        logger.info(f"Deleting {len(ids_to_delete)} old items...")
-        db.delete(ids=ids_to_delete)
-    else:
-        logger.info("No items to delete.")
-
-    if docs_to_add:
-        logger.info(f"Found {len(docs_to_add)} items to upsert. Processing in batches...")
-        
-        batch_size = 4000 
-        total_docs = len(docs_to_add)
-        
-        for i in range(0, total_docs, batch_size):
-            batch_docs = docs_to_add[i : i + batch_size]
-            batch_ids = ids_to_add[i : i + batch_size]
-            
-            logger.info(f"   Upserting batch {i//batch_size + 1} ({len(batch_docs)} items)...")
-            db.add_documents(batch_docs, ids=batch_ids)
-            
-        logger.info(f"Upsert complete ({total_docs} items).")
-    else:
-        logger.info("No new or updated items found.")
+    # The sidecar stores and the writer are released on every path, errors included
+    with ExitStack() as stack:
+        logger.info("Reading existing database...")
+        # Only ids, hashes and attribute versions are needed; the manifest holds exactly that
+        manifest = stack.enter_context(closing(IndexManifest(Path(db_path) / MANIFEST_FILE)))
+        existing_entries = load_existing_entries(db, manifest, read_index_version(db_path))
+        existing_ids = set(existing_entries)
+
+        # Keep the lexical index in step; rebuild it if it is new, out of sync or was
+        # built with another tokenizer
+        lexical_store = stack.enter_context(
+            closing(LexicalIndexStore(Path(db_path) / LEXICAL_INDEX_FILE))
+        )
+        rebuild_lexical = (
+            lexical_store.tokenizer() != TOKENIZER or len(lexical_store) != len(existing_ids)
+        )
+        # Cleared only once data arrives, so an aborted run leaves the old index in place
+        lexical_cleared = False
+
+        writer = stack.enter_context(
+            closing(CatalogWriter(db, embedding_model, manifest, lexical_store))
+        )
+        ids_seen_in_source = set() 
+        failed_sources: List[str] = []
+        progress: Dict[str, Dict[str, int]] = {}
+
+        logger.info("Streaming sources (Delta Check per chunk)...")
+        for source_name, records in iter_source_chunks(failed_sources=failed_sources):
+            stats = progress.setdefault(source_name, {"read": 0, "changed": 0, "refresh": 0})
+            if rebuild_lexical and records and not lexical_cleared:
+                logger.info(f"Rebuilding lexical index ({TOKENIZER} tokenizer)...")
+                lexical_store.update({}, [], rebuild=True)
+                lexical_cleared = True
+            # Unchanged items only need lexical entries when that index is rebuilt
+            lexical_texts = {}
+
+            for item in records:
+                doc_id = str(item.get('id', 'unknown'))
+
+                # Simple dedupe in source
+                if doc_id in ids_seen_in_source:
+                    continue
+                ids_seen_in_source.add(doc_id)
+                stats["read"] += 1
+
+                doc, search_text = build_course_document(doc_id, item)
+                existing = existing_entries.get(doc_id)
+                if existing is None or existing[0] != doc.metadata["content_hash"]:
+                    if existing is not None:
+                        logger.debug(f"Draft update found for: {item.get('title')}")
+                    writer.add(doc_id, doc, search_text)
+                    stats["changed"] += 1
+                    continue
+
+                if existing[1] != ATTRIBUTES_VERSION:
+                    writer.refresh(doc_id, doc.metadata)
+                    stats["refresh"] += 1
+                if rebuild_lexical:
+                    lexical_texts[doc_id] = search_text
+
+            if lexical_texts:
+                lexical_store.update(lexical_texts, [])
+            logger.info(
+                f"   {source_name}: {stats['read']} items read, {stats['changed']} new/changed, "
+                f"{stats['refresh']} attribute refreshes"
+            )
+        writer.finish()
+
+        if not ids_seen_in_source:
+            logger.warning("No data found in catalog files. Aborting.")
+            return
+
+        if writer.upserted:
+            logger.info(f"Upsert complete ({writer.upserted} items, {writer.reused} vectors reused from cache).")
+        else:
+            logger.info("No new or updated items found.")
+        if writer.refreshed:
+            logger.info(f"Refreshed ranking attributes of {writer.refreshed} items (no re-embedding).")
+
+        ids_to_delete = list(existing_ids - ids_seen_in_source)
+        if ids_to_delete and failed_sources:
+            # Items of a source that failed mid-read were not seen; keep them until it loads again
+            logger.warning(f"Skipping deletion of {len(ids_to_delete)} items because a source failed to load.")
+            ids_to_delete = []
+
+        if ids_to_delete:
+            logger.info(f"Deleting {len(ids_to_delete)} old items...")
+            db.delete(ids=ids_to_delete)
+            manifest.delete(ids_to_delete)
+            lexical_store.update({}, ids_to_delete)
+        else:
+            logger.info("No items to delete.")
+
+        # Stamp a new index version so cached recommendations are invalidated
+        if ids_to_delete or writer.upserted or writer.refreshed or rebuild_lexical:
+            bump_index_version(db_path)
+
+        # The manifest now mirrors the collection at the current version
+        manifest.mark_current(read_index_version(db_path))
+        prune_vector_cache(manifest)
+
+    # Re-export the memory-mapped matrix whenever it lags behind the collection
+    if FLAT_INDEX_EXPORT:
+        index_version = read_index_version(db_path)
+        if read_flat_index_version(flat_index_dir(db_path)) != index_version:
+            logger.info("Exporting flat index...")
+            export_flat_index(db, flat_index_dir(db_path), index_version, dtype=FLAT_INDEX_DTYPE)
 
     logger.info("="*50)
     logger.info("INCREMENTAL UPDATE FINISHED")
@@ -1,14 +1,16 @@
-import requests
-import pandas as pd
-import time
-import random
 from langdetect import detect, LangDetectException
 import os
 from dotenv import load_dotenv 
+from src.engine.catalog_store import save_catalog
+from src.ingestion.crawl_checkpoint import crawl_session
+from src.ingestion.http_client import HttpClient
 
 load_dotenv()
 
-def fetch_courses(limit_per_page=100, max_pages=5, start_page_num=1):
+# Starting requests per second; the shared host limiter adapts it to the API's responses
+REQUESTS_PER_SECOND = 0.3
+
+def fetch_courses(limit_per_page=100, max_pages=5, start_page_num=1, client=None, checkpoint=None):
     base_url = os.getenv("URL_COURSERA_API")
     
     fields = "name,description,slug,level,primaryLanguages,workload,domainTypes,certificates,photoUrl"
@@ -23,128 +25,114 @@ def fetch_courses(limit_per_page=100, max_pages=5, start_page_num=1):
     
     current_page = start_page_num
     pages_fetched = 0
+
+    # Pages are checkpointed with the paging.next cursor, so a failed crawl resumes there.
+    # One keep-alive session serves every page (pass client to reuse or stub it)
+    with crawl_session(
+        client,
+        checkpoint,
+        "coursera",
+        f"{limit_per_page}:{start_page_num}",
+        new_client=lambda: HttpClient(headers=headers, rate=REQUESTS_PER_SECOND),
+    ) as session:
+        cursor, pages_fetched, all_courses = session.resume()
+        if cursor is not None:
+            start = int(cursor)
+            current_page = start_page_num + pages_fetched
+
+        print(f"Starting fetch process (Stealth Mode)...")
     
-    print(f"Starting fetch process (Stealth Mode)...")
-    
-    while pages_fetched < max_pages:
-        params = {
-            "start": start,
-            "limit": limit_per_page,
-            "fields": fields
-        }
+        while pages_fetched < max_pages:
+            params = {
+                "start": start,
+                "limit": limit_per_page,
+                "fields": fields
+            }
         
-        try:
-            # [แก้ไข] ใส่ headers เข้าไปใน request
-            response = requests.get(base_url, params=params, headers=headers)
+            try:
+                response = session.client.get(base_url, params=params)
             
-            # [เพิ่ม] ดักจับ Error 429 (Rate Limit)
-            if response.status_code == 429:
-                print("Rate limit hit. Pausing for 60 seconds...")
-                time.sleep(60)
-                continue
+                # Still throttled after the client's retries; the host limiter has
+                # slowed down (and honours Retry-After), so try the page again
+                if response.status_code == 429:
+                    print("Rate limit hit. Backing off...")
+                    continue
 
-            if response.status_code == 200:
-                data = response.json()
-                elements = data.get('elements', [])
+                if response.status_code == 200:
+                    data = response.json()
+                    elements = data.get('elements', [])
                 
-                if not elements:
-                    print("No more data available.")
-                    break
+                    if not elements:
+                        print("No more data available.")
+                        break
                 
-                filtered_count = 0
-                for item in elements:
-                    languages = item.get("primaryLanguages", [])
-                    if 'en' not in languages:
-                        continue
+                    page_courses = []
+                    for item in elements:
+                        languages = item.get("primaryLanguages", [])
+                        if 'en' not in languages:
+                            continue
                     
-                    title = item.get("name", "")
-                    description = item.get("description", "")
-                    text_to_check = f"{title} {description}"[:500] 
+                        title = item.get("name", "")
+                        description = item.get("description", "")
+                        text_to_check = f"{title} {description}"[:500] 
                     
-                    try:
-                        detected_lang = detect(text_to_check)
+                        try:
+                            detected_lang = detect(text_to_check)
                         
-                        # Allow only English (en) and Thai (th)
-                        # This removes French, Spanish, etc. even if metadata says 'en'
-                        if detected_lang not in ['en', 'th']:
-                            continue
+                            # Allow only English (en) and Thai (th)
+                            # This removes French, Spanish, etc. even if metadata says 'en'
+                            if detected_lang not in ['en', 'th']:
+                                continue
                             
-                    except LangDetectException:
-                        pass
+                        except LangDetectException:
+                            pass
 
-                    domains = item.get("domainTypes", [])
-                    if domains:
-                        category = domains[0].get("subdomainId") or domains[0].get("domainId") or "General"
-                    else:
-                        category = "General"
+                        domains = item.get("domainTypes", [])
+                        if domains:
+                            category = domains[0].get("subdomainId") or domains[0].get("domainId") or "General"
+                        else:
+                            category = "General"
 
-                    certs = item.get("certificates", [])
-                    cert_str = ", ".join(certs) if certs else "Standard Course Certificate"
+                        certs = item.get("certificates", [])
+                        cert_str = ", ".join(certs) if certs else "Standard Course Certificate"
 
-                    course_info = {
-                        "id": item.get("id"),
-                        "title": item.get("name"),
-                        "description": item.get("description"),
-                        "level": item.get("level", "Not Specified"),
-                        "duration": item.get("workload", "Self-paced"),
-                        "category": category,
-                        "certificate_type": cert_str,
-                        "url": f"https://www.coursera.org/learn/{item.get('slug')}",
-                        "image_url": item.get("photoUrl")
-                    }
-                    all_courses.append(course_info)
-                    filtered_count += 1
+                        course_info = {
+                            "id": item.get("id"),
+                            "title": item.get("name"),
+                            "description": item.get("description"),
+                            "level": item.get("level", "Not Specified"),
+                            "duration": item.get("workload", "Self-paced"),
+                            "category": category,
+                            "certificate_type": cert_str,
+                            "url": f"https://www.coursera.org/learn/{item.get('slug')}",
+                            "image_url": item.get("photoUrl")
+                        }
+                        page_courses.append(course_info)
                 
-                print(f"Page {current_page}: Fetched {len(elements)} items (Kept {filtered_count}).")
+                    all_courses.extend(page_courses)
+                    print(f"Page {current_page}: Fetched {len(elements)} items (Kept {len(page_courses)}).")
+                
+                    if 'paging' in data and 'next' in data['paging']:
+                        start = int(data['paging']['next'])
+                        current_page += 1
+                        pages_fetched += 1
+                        session.save_page(page_courses, start)
+                    else:
+                        print("End of catalog reached.")
+                        break
                 
-                if 'paging' in data and 'next' in data['paging']:
-                    start = int(data['paging']['next'])
-                    current_page += 1
-                    pages_fetched += 1
                 else:
-                    print("End of catalog reached.")
+                    print(f"Error: {response.status_code}")
+                    session.failed = True
                     break
                 
-                # [แก้ไข] สุ่มเวลาพัก 2.0 - 5.0 วินาที (จากเดิม 1 วิ)
-                sleep_time = random.uniform(2.0, 5.0)
-                time.sleep(sleep_time)
-                
-            else:
-                print(f"Error: {response.status_code}")
+            except Exception as e:
+                print(f"Exception: {e}")
+                session.failed = True
                 break
-                
-        except Exception as e:
-            print(f"Exception: {e}")
-            break
 
     return all_courses
 
-def save_to_csv(courses, filename="coursera_dataset.csv"):
-    if not courses:
-        print("⚠️ No data to save.")
-        return
-
-    current_file_path = os.path.abspath(__file__)
-    
-    modules_dir = os.path.dirname(current_file_path)
-    
-    project_root = os.path.dirname(modules_dir)
-    
-    data_dir = os.path.join(project_root, 'data')
-    
-    if not os.path.exists(data_dir):
-        os.makedirs(data_dir)
-        print(f"Created folder: {data_dir}")
-
-    # 5. รวมร่าง Path กับชื่อไฟล์
-    full_path = os.path.join(data_dir, filename)
-    
-    # 6. บันทึกไฟล์
-    df = pd.DataFrame(courses)
-    df.to_csv(full_path, index=False, encoding='utf-8-sig')
-    
-    print(f"Saved {len(df)} courses to: {full_path}")
-
 if __name__ == "__main__":
     courses = fetch_courses(max_pages=40)
-    save_to_csv(courses)
\ No newline at end of file
+    save_catalog(courses, "coursera_dataset")
\ No newline at end of file
@@ -0,0 +1,169 @@
+import json
+import sqlite3
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from src.config import CRAWL_CHECKPOINT_MAX_AGE, CRAWL_CHECKPOINT_PATH
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class CrawlCheckpoint:
+    """Pages of one paginated crawl and its next cursor, saved as each page arrives.
+
+    A crawl that stops early (exception, error status, killed process) resumes
+    from its last cursor with the pages it already has. A finished crawl, one
+    started with other parameters, or one older than max_age starts over.
+    Several sources can share one file; rows are keyed by source.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        source: str,
+        params: str = "",
+        max_age: float = CRAWL_CHECKPOINT_MAX_AGE,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.source = source
+        self.params = params
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS crawls ("
+            "source TEXT PRIMARY KEY, params TEXT NOT NULL, next_cursor TEXT, "
+            "finished INTEGER NOT NULL, started_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "source TEXT NOT NULL, seq INTEGER NOT NULL, records TEXT NOT NULL, "
+            "PRIMARY KEY (source, seq))"
+        )
+        self._conn.commit()
+
+    def _reset(self) -> None:
+        now = time.time()
+        self._conn.execute("DELETE FROM pages WHERE source = ?", (self.source,))
+        self._conn.execute(
+            "INSERT OR REPLACE INTO crawls "
+            "(source, params, next_cursor, finished, started_at, updated_at) "
+            "VALUES (?, ?, NULL, 0, ?, ?)",
+            (self.source, self.params, now, now),
+        )
+
+    def resume(self) -> Tuple[Optional[str], int, List[Dict[str, Any]]]:
+        """(next cursor, pages done, records) of an unfinished crawl; (None, 0, []) otherwise.
+
+        Anything that cannot be resumed is cleared, so the caller starts a new crawl.
+        """
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT params, next_cursor, finished, started_at FROM crawls WHERE source = ?",
+                (self.source,),
+            ).fetchone()
+            if (
+                row is None
+                or row[0] != self.params
+                or row[1] is None
+                or row[2]
+                or time.time() - row[3] > self.max_age
+            ):
+                self._reset()
+                return None, 0, []
+
+            pages = self._conn.execute(
+                "SELECT records FROM pages WHERE source = ? ORDER BY seq", (self.source,)
+            ).fetchall()
+        records = [record for (page,) in pages for record in json.loads(page)]
+        logger.info(
+            f"Resuming {self.source} crawl at cursor {row[1]} "
+            f"({len(pages)} pages, {len(records)} records checkpointed)"
+        )
+        return row[1], len(pages), records
+
+    def save_page(self, records: List[Dict[str, Any]], next_cursor: Any) -> None:
+        """Persist one page's records together with the cursor of the page after it."""
+        with self._lock, self._conn:
+            seq = self._conn.execute(
+                "SELECT COUNT(*) FROM pages WHERE source = ?", (self.source,)
+            ).fetchone()[0]
+            self._conn.execute(
+                "INSERT INTO pages (source, seq, records) VALUES (?, ?, ?)",
+                (self.source, seq, json.dumps(records, ensure_ascii=False)),
+            )
+            self._conn.execute(
+                "UPDATE crawls SET next_cursor = ?, updated_at = ? WHERE source = ?",
+                (str(next_cursor), time.time(), self.source),
+            )
+
+    def finish(self) -> None:
+        """Mark the crawl complete and drop its pages; the next run starts over."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM pages WHERE source = ?", (self.source,))
+            self._conn.execute(
+                "UPDATE crawls SET finished = 1, updated_at = ? WHERE source = ?",
+                (time.time(), self.source),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def open_checkpoint(source: str, params: str = "") -> Optional[CrawlCheckpoint]:
+    """Checkpoint of a source's crawl, or None when CRAWL_CHECKPOINT_PATH is empty."""
+    if not CRAWL_CHECKPOINT_PATH:
+        return None
+    return CrawlCheckpoint(CRAWL_CHECKPOINT_PATH, source, params)
+
+
+class CrawlSession:
+    """HTTP client and checkpoint of one crawl; set failed to keep the checkpoint resumable."""
+
+    def __init__(self, client: Any, checkpoint: Optional[CrawlCheckpoint]):
+        self.client = client
+        self.checkpoint = checkpoint
+        self.failed = False
+
+    def resume(self) -> Tuple[Optional[str], int, List[Dict[str, Any]]]:
+        if self.checkpoint is None:
+            return None, 0, []
+        return self.checkpoint.resume()
+
+    def save_page(self, records: List[Dict[str, Any]], next_cursor: Any) -> None:
+        if self.checkpoint is not None:
+            self.checkpoint.save_page(records, next_cursor)
+
+
+@contextmanager
+def crawl_session(
+    client: Any,
+    checkpoint: Optional[CrawlCheckpoint],
+    source: str,
+    params: str = "",
+    new_client: Optional[Callable[[], Any]] = None,
+) -> Iterator[CrawlSession]:
+    """Crawl with the given client and checkpoint, opening (and later closing) any left None.
+
+    The checkpoint is marked finished only when the crawl neither raised nor
+    set failed; either way, whatever was opened here is closed on exit.
+    """
+    with ExitStack() as stack:
+        if checkpoint is None:
+            checkpoint = open_checkpoint(source, params)
+            if checkpoint is not None:
+                stack.callback(checkpoint.close)
+        if client is None and new_client is not None:
+            client = new_client()
+            stack.callback(client.close)
+        session = CrawlSession(client, checkpoint)
+        yield session
+        if checkpoint is not None and not session.failed:
+            checkpoint.finish()
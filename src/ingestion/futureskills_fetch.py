@@ -1,22 +1,23 @@
-# [เปลี่ยน] จาก import requests เป็นอันนี้
-from curl_cffi import requests 
-import pandas as pd
-import time
-import random
 import re
 import json
 import os
 from dotenv import load_dotenv 
+from src.engine.catalog_store import save_catalog
+from src.ingestion.crawl_checkpoint import crawl_session
+from src.ingestion.http_client import IMPERSONATE, HttpClient
 
 load_dotenv()
 
+# Starting requests per second; the shared host limiter adapts it to the API's responses
+REQUESTS_PER_SECOND = 0.3
+
 
 def remove_html_tags(text):
     if not text: return ""
     clean = re.compile('<.*?>')
     return re.sub(clean, ' ', str(text)).strip()
 
-def fetch_futureskill(limit_pages=5):
+def fetch_futureskill(limit_pages=5, client=None, checkpoint=None):
     base_url = os.getenv("URL_FUTURESKILL_API")
     
     # Headers ให้ใส่เหมือน Browser จริง
@@ -31,83 +32,95 @@ def fetch_futureskill(limit_pages=5):
     all_courses = []
     page = 1
     limit_per_req = 10
+
+    # Pages are checkpointed with the next page number, so a failed crawl resumes there.
+    # One keep-alive session impersonating Chrome serves every page
+    with crawl_session(
+        client,
+        checkpoint,
+        "futureskill",
+        str(limit_per_req),
+        new_client=lambda: HttpClient(
+            headers=headers, impersonate=IMPERSONATE, rate=REQUESTS_PER_SECOND
+        ),
+    ) as session:
+        cursor, _, all_courses = session.resume()
+        if cursor is not None:
+            page = int(cursor)
+
+        print(f"Starting fetch FutureSkill (Impersonating Chrome)...")
     
-    print(f"Starting fetch FutureSkill (Impersonating Chrome)...")
-    
-    while page <= limit_pages:
-        params = {
-            "sort": '{"createdAt":"DESC"}',
-            "search": "",
-            "page": page,
-            "limit": limit_per_req,
-            "type": '{"provider":"FUTURESKILL"}'
-        }
+        while page <= limit_pages:
+            params = {
+                "sort": '{"createdAt":"DESC"}',
+                "search": "",
+                "page": page,
+                "limit": limit_per_req,
+                "type": '{"provider":"FUTURESKILL"}'
+            }
         
-        try:
-            # [จุดสำคัญ] เพิ่ม parameter: impersonate="chrome"
-            # คำสั่งนี้จะทำให้ Python ของเราแปลงร่างเป็น Chrome 100%
-            response = requests.get(
-                base_url, 
-                params=params, 
-                headers=headers, 
-                impersonate="chrome" 
-            )
+            try:
+                response = session.client.get(base_url, params=params)
             
-            if response.status_code == 200:
-                data = response.json()
+                if response.status_code == 200:
+                    data = response.json()
                 
-                # ... (Logic แกะ JSON เหมือนเดิมเป๊ะ) ...
-                items = data.get('data', {}).get('items', {}).get('courses', [])
+                    # ... (Logic แกะ JSON เหมือนเดิมเป๊ะ) ...
+                    items = data.get('data', {}).get('items', {}).get('courses', [])
                 
-                if not items:
-                    print("No more data.")
-                    break
+                    if not items:
+                        print("No more data.")
+                        break
                 
-                for item in items:
-                    title = item.get('name', 'Untitled')
-                    desc = remove_html_tags(item.get('description', ''))
+                    page_courses = []
+                    for item in items:
+                        title = item.get('name', 'Untitled')
+                        desc = remove_html_tags(item.get('description', ''))
                     
-                    instructor_info = item.get('instructor', {})
-                    instructor_name = instructor_info.get('name', 'FutureSkill Instructor') if instructor_info else 'FutureSkill Instructor'
+                        instructor_info = item.get('instructor', {})
+                        instructor_name = instructor_info.get('name', 'FutureSkill Instructor') if instructor_info else 'FutureSkill Instructor'
 
-                    cats = item.get('categories', [])
-                    category = cats[0].get('name', 'General') if cats else 'General'
+                        cats = item.get('categories', [])
+                        category = cats[0].get('name', 'General') if cats else 'General'
 
-                    image_url = item.get('thumbnailUrl', '')
+                        image_url = item.get('thumbnailUrl', '')
                     
-                    # Duration เป็นวินาที หาร 60
-                    duration_sec = item.get('duration', 0)
-                    duration_str = format_duration(duration_sec)
+                        # Duration เป็นวินาที หาร 60
+                        duration_sec = item.get('duration', 0)
+                        duration_str = format_duration(duration_sec)
 
-                    course_id = item.get('id')
-                    url = f"https://futureskill.co/course/detail/{course_id}"
+                        course_id = item.get('id')
+                        url = f"https://futureskill.co/course/detail/{course_id}"
 
-                    course_info = {
-                        "id": f"fs_{course_id}",
-                        "title": title,
-                        "description": desc,
-                        "instructor": instructor_name,
-                        "price": "Subscription",
-                        "duration": duration_str,
-                        "category": category,
-                        "image_url": image_url,
-                        "url": url,
-                        "source": "FutureSkill"
-                    }
-                    all_courses.append(course_info)
+                        course_info = {
+                            "id": f"fs_{course_id}",
+                            "title": title,
+                            "description": desc,
+                            "instructor": instructor_name,
+                            "price": "Subscription",
+                            "duration": duration_str,
+                            "category": category,
+                            "image_url": image_url,
+                            "url": url,
+                            "source": "FutureSkill"
+                        }
+                        page_courses.append(course_info)
                 
-                print(f"   Page {page}: Fetched {len(items)} items.")
-                page += 1
-                time.sleep(random.uniform(2.0, 4.0)) # พักนานนิดนึง
+                    all_courses.extend(page_courses)
+                    print(f"   Page {page}: Fetched {len(items)} items.")
+                    page += 1
+                    session.save_page(page_courses, page)
                 
-            else:
-                print(f"❌ Error: {response.status_code}")
-                # ถ้ายัง 403 อีก อาจจะต้องพักยาว
-                break
+                else:
+                    print(f"❌ Error: {response.status_code}")
+                    # ถ้ายัง 403 อีก อาจจะต้องพักยาว
+                    session.failed = True
+                    break
                 
-        except Exception as e:
-            print(f"❌ Exception: {e}")
-            break
+            except Exception as e:
+                print(f"❌ Exception: {e}")
+                session.failed = True
+                break
 
     return all_courses
 
@@ -124,35 +137,8 @@ def format_duration(milliseconds):
     else:
         return f"{mins}m"
 
-def save_to_csv(courses, filename="futureskill_dataset.csv"):
-    if not courses:
-        print("⚠️ No data to save.")
-        return
-
-    current_file_path = os.path.abspath(__file__)
-    
-    modules_dir = os.path.dirname(current_file_path)
-    
-    project_root = os.path.dirname(modules_dir)
-    
-    data_dir = os.path.join(project_root, 'data')
-    
-    if not os.path.exists(data_dir):
-        os.makedirs(data_dir)
-        print(f"Created folder: {data_dir}")
-
-    # 5. รวมร่าง Path กับชื่อไฟล์
-    full_path = os.path.join(data_dir, filename)
-    
-    # 6. บันทึกไฟล์
-    df = pd.DataFrame(courses)
-    df.to_csv(full_path, index=False, encoding='utf-8-sig')
-    
-    print(f"Saved {len(df)} courses to: {full_path}")
-    
 if __name__ == "__main__":
     courses = fetch_futureskill(limit_pages=100)
     if courses:
-        df = pd.DataFrame(courses)
-        save_to_csv(courses, "futureskill_dataset.csv")
-        print(f"Success! Fetched {len(df)} courses.")
\ No newline at end of file
+        save_catalog(courses, "futureskill_dataset")
+        print(f"Success! Fetched {len(courses)} courses.")
\ No newline at end of file
@@ -0,0 +1,176 @@
+import asyncio
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from curl_cffi.requests import AsyncSession
+from curl_cffi.requests import Session as CurlSession
+from requests.adapters import HTTPAdapter
+
+from src.config import HTTP_MAX_RETRIES, HTTP_POOL_SIZE, HTTP_TIMEOUT
+from src.ingestion.rate_limiter import (
+    THROTTLE_STATUSES,
+    HostRateLimiter,
+    get_host_limiter,
+    parse_retry_after,
+)
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Browser profile curl_cffi mimics (TLS and HTTP/2 fingerprint) for sites that block plain clients
+IMPERSONATE = "chrome"
+
+# Starting requests per second per host when a fetcher does not set one (0 disables limiting)
+DEFAULT_RATE = 2.0
+
+
+def _limiter(url: str, rate: float) -> Optional[HostRateLimiter]:
+    return get_host_limiter(urlsplit(url).netloc, rate) if rate > 0 else None
+
+
+def _should_retry(
+    limiter: Optional[HostRateLimiter],
+    ticket: Optional[int],
+    response: Any,
+    attempt: int,
+    retries: int,
+) -> bool:
+    """Feed a response to the host limiter; True if it was throttled and may be retried."""
+    if limiter is None:
+        return False
+    status = response.status_code
+    limiter.record(status, parse_retry_after(response.headers.get("Retry-After")), ticket)
+    if status not in THROTTLE_STATUSES or attempt >= retries:
+        return False
+    logger.info(f"HTTP {status} from {urlsplit(str(response.url)).netloc}; retrying after backoff")
+    return True
+
+
+class HttpClient:
+    """Pooled keep-alive HTTP session shared by every request of one fetcher.
+
+    Plain requests use a requests.Session; with impersonate set, a curl_cffi
+    Session presents a browser fingerprint. Both keep connections open between
+    pages instead of paying a TCP and TLS handshake per request. Each request
+    waits for the host's shared rate limiter, starting at rate requests per
+    second, and throttled responses are retried up to retries times.
+    """
+
+    def __init__(
+        self,
+        headers: Optional[Dict[str, str]] = None,
+        impersonate: Optional[str] = None,
+        pool_size: int = HTTP_POOL_SIZE,
+        timeout: float = HTTP_TIMEOUT,
+        rate: float = DEFAULT_RATE,
+        retries: int = HTTP_MAX_RETRIES,
+    ):
+        self.timeout = timeout
+        self.impersonate = impersonate
+        self.rate = rate
+        self.retries = retries
+        if impersonate:
+            self._session: Any = CurlSession(impersonate=impersonate, headers=headers)
+        else:
+            self._session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            self._session.mount("https://", adapter)
+            self._session.mount("http://", adapter)
+            if headers:
+                self._session.headers.update(headers)
+
+    def get(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """GET through the pooled session; the response has status_code, text, content and json()."""
+        limiter = _limiter(url, self.rate)
+        attempt = 0
+        while True:
+            ticket = limiter.acquire() if limiter is not None else None
+            try:
+                response = self._session.get(
+                    url, params=params, headers=headers, timeout=timeout or self.timeout
+                )
+            except Exception:
+                if limiter is not None:
+                    limiter.record(None, ticket=ticket)
+                raise
+            if not _should_retry(limiter, ticket, response, attempt, self.retries):
+                return response
+            attempt += 1
+
+    def close(self) -> None:
+        self._session.close()
+
+    def __enter__(self) -> "HttpClient":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+class AsyncHttpClient:
+    """asyncio counterpart of HttpClient on a curl_cffi AsyncSession.
+
+    Up to pool_size requests are in flight at once over reused connections;
+    further requests wait for a free handle. Rate limiting and retries work as
+    in HttpClient, sharing the same per-host limiters.
+    """
+
+    def __init__(
+        self,
+        headers: Optional[Dict[str, str]] = None,
+        impersonate: Optional[str] = None,
+        pool_size: int = HTTP_POOL_SIZE,
+        timeout: float = HTTP_TIMEOUT,
+        rate: float = DEFAULT_RATE,
+        retries: int = HTTP_MAX_RETRIES,
+    ):
+        self.timeout = timeout
+        self.impersonate = impersonate
+        self.rate = rate
+        self.retries = retries
+        self._session = AsyncSession(
+            max_clients=pool_size, impersonate=impersonate, headers=headers
+        )
+        # Only requests about to go out hold a rate-limiter reservation, so rate
+        # changes apply to the rest of the queue
+        self._slots = asyncio.Semaphore(pool_size)
+
+    async def get(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        limiter = _limiter(url, self.rate)
+        attempt = 0
+        while True:
+            async with self._slots:
+                ticket = await limiter.acquire_async() if limiter is not None else None
+                try:
+                    response = await self._session.get(
+                        url, params=params, headers=headers, timeout=timeout or self.timeout
+                    )
+                except Exception:
+                    if limiter is not None:
+                        limiter.record(None, ticket=ticket)
+                    raise
+            if not _should_retry(limiter, ticket, response, attempt, self.retries):
+                return response
+            attempt += 1
+
+    async def close(self) -> None:
+        await self._session.close()
+
+    async def __aenter__(self) -> "AsyncHttpClient":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
@@ -1,17 +1,18 @@
-import os
-import requests
-import pandas as pd
+import asyncio
 import xml.etree.ElementTree as ET
 import time
-import sys
-import random
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.engine.catalog_store import save_catalog
+from src.ingestion.http_client import AsyncHttpClient
 
-def fetch_single_sitemap(url, headers):
+SITEMAP_INDEX_URL = "https://www.khanacademy.org/sitemap.xml"
+# Starting requests per second across all sitemap requests; adapted by the host limiter
+REQUESTS_PER_SECOND = 20.0
+HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"}
+
+async def fetch_single_sitemap(client, url):
     extracted_courses = []
     try:
-        # ใช้ requests ธรรมดา เพราะ debug ผ่านแล้ว
-        resp = requests.get(url, headers=headers, timeout=10)
+        resp = await client.get(url, timeout=10)
         if resp.status_code != 200:
             return []
 
@@ -68,126 +69,92 @@ def fetch_single_sitemap(url, headers):
         
     return extracted_courses
 
-def fetch_khan_academy(limit_courses=2000, max_workers=20):
-    sitemap_index_url = "https://www.khanacademy.org/sitemap.xml"
-    headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"}
-    
+def fetch_khan_academy(limit_courses=2000, max_workers=20, sitemap_index_url=SITEMAP_INDEX_URL):
     print(f"🚀 Starting fetch Khan Academy (High Patience Mode)...")
     print(f"💡 Press Ctrl+C to stop safely.")
-    
-    all_courses = []
-    seen_ids = set()
-    
-    try:
-        response = requests.get(sitemap_index_url, headers=headers)
-        root = ET.fromstring(response.content)
-        
-        target_sitemaps = []
-        wanted_keywords = ['math', 'science', 'computing', 'economics']
-        
-        # หา Link ทั้งหมดใน Index
-        all_locs = [elem.text for elem in root.findall('.//{http://www.sitemaps.org/schemas/sitemap/0.9}loc')]
-        
-        for loc in all_locs:
-            if any(k in loc for k in wanted_keywords) and ('es-' not in loc and 'pt-' not in loc):
-                target_sitemaps.append(loc)
-                
-        print(f"📋 Found {len(target_sitemaps)} sitemaps to scan.")
-        
-    except Exception as e:
-        print(f"❌ Error getting index: {e}")
-        return []
 
-    print(f"⚡ Processing with {max_workers} threads...")
-    
-    executor = ThreadPoolExecutor(max_workers=max_workers)
-    future_to_url = {}
-    
+    # Filled as sitemaps complete, so an interrupted crawl still returns what it found
+    all_courses = []
     try:
-        for url in target_sitemaps:
-            future = executor.submit(fetch_single_sitemap, url, headers)
-            future_to_url[future] = url
-            
-        completed_count = 0
-        consecutive_empty_scans = 0
-        
-        for future in as_completed(future_to_url):
-            try:
-                data = future.result()
-                if data:
-                    found_new = False
-                    for item in data:
-                        if item['id'] not in seen_ids:
-                            all_courses.append(item)
-                            seen_ids.add(item['id'])
-                            found_new = True
-                    
-                    if found_new:
-                        consecutive_empty_scans = 0
-                        # เจอของแล้ว! ปริ้นบอกหน่อย
-                        print(f"   🎉 Found: {data[0]['title']} ({len(data)} items)")
-                    else:
-                        consecutive_empty_scans += 1
-                else:
-                    consecutive_empty_scans += 1
-                
-                # [แก้] เพิ่มความอดทนเป็น 3000
-                if consecutive_empty_scans > 3000:
-                    print("\n🛑 No new courses found for 3000 sitemaps. Stopping early.")
-                    for f in future_to_url: f.cancel()
-                    break
-                
-                completed_count += 1
-                if completed_count % 100 == 0:
-                    print(f"   Scanning... {completed_count}/{len(target_sitemaps)} (Total Found: {len(all_courses)})")
-                
-                if len(all_courses) >= limit_courses:
-                    print("🛑 Reached limit.")
-                    for f in future_to_url: f.cancel()
-                    break
-
-            except Exception:
-                continue
-
+        asyncio.run(crawl_sitemaps(sitemap_index_url, all_courses, limit_courses, max_workers))
     except KeyboardInterrupt:
         print("\n⚠️  Interrupted! Saving data...")
-        executor.shutdown(wait=False, cancel_futures=True)
-        return all_courses
+    return all_courses
 
-    finally:
-        executor.shutdown(wait=False)
+async def crawl_sitemaps(sitemap_index_url, all_courses, limit_courses, max_workers):
+    # max_workers requests in flight on one pooled session instead of one thread each
+    async with AsyncHttpClient(headers=HEADERS, pool_size=max_workers, rate=REQUESTS_PER_SECOND) as client:
+        try:
+            response = await client.get(sitemap_index_url)
+            root = ET.fromstring(response.content)
+            
+            target_sitemaps = []
+            wanted_keywords = ['math', 'science', 'computing', 'economics']
+            
+            # หา Link ทั้งหมดใน Index
+            all_locs = [elem.text for elem in root.findall('.//{http://www.sitemaps.org/schemas/sitemap/0.9}loc')]
+            
+            for loc in all_locs:
+                if any(k in loc for k in wanted_keywords) and ('es-' not in loc and 'pt-' not in loc):
+                    target_sitemaps.append(loc)
+                    
+            print(f"📋 Found {len(target_sitemaps)} sitemaps to scan.")
+            
+        except Exception as e:
+            print(f"❌ Error getting index: {e}")
+            return
 
-    return all_courses
+        print(f"⚡ Processing with {max_workers} concurrent requests...")
 
-def save_to_csv(courses, filename="khan_dataset.csv"):
-    if not courses:
-        print("⚠️ No data to save.")
-        return
+        seen_ids = set()
+        tasks = [asyncio.create_task(fetch_single_sitemap(client, url)) for url in target_sitemaps]
+        completed_count = 0
+        consecutive_empty_scans = 0
 
-    current_file_path = os.path.abspath(__file__)
-    
-    modules_dir = os.path.dirname(current_file_path)
-    
-    project_root = os.path.dirname(modules_dir)
-    
-    data_dir = os.path.join(project_root, 'data')
-    
-    if not os.path.exists(data_dir):
-        os.makedirs(data_dir)
-        print(f"Created folder: {data_dir}")
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    data = await next_done
+                    if data:
+                        found_new = False
+                        for item in data:
+                            if item['id'] not in seen_ids:
+                                all_courses.append(item)
+                                seen_ids.add(item['id'])
+                                found_new = True
+                        
+                        if found_new:
+                            consecutive_empty_scans = 0
+                            # เจอของแล้ว! ปริ้นบอกหน่อย
+                            print(f"   🎉 Found: {data[0]['title']} ({len(data)} items)")
+                        else:
+                            consecutive_empty_scans += 1
+                    else:
+                        consecutive_empty_scans += 1
+                    
+                    # [แก้] เพิ่มความอดทนเป็น 3000
+                    if consecutive_empty_scans > 3000:
+                        print("\n🛑 No new courses found for 3000 sitemaps. Stopping early.")
+                        break
+                    
+                    completed_count += 1
+                    if completed_count % 100 == 0:
+                        print(f"   Scanning... {completed_count}/{len(target_sitemaps)} (Total Found: {len(all_courses)})")
+                    
+                    if len(all_courses) >= limit_courses:
+                        print("🛑 Reached limit.")
+                        break
 
-    # 5. รวมร่าง Path กับชื่อไฟล์
-    full_path = os.path.join(data_dir, filename)
-    
-    # 6. บันทึกไฟล์
-    df = pd.DataFrame(courses)
-    df.to_csv(full_path, index=False, encoding='utf-8-sig')
-    
-    print(f"Saved {len(df)} courses to: {full_path}")
+                except Exception:
+                    continue
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
 
 if __name__ == "__main__":
     start_time = time.time()
     courses = fetch_khan_academy(limit_courses=2000, max_workers=20)
     end_time = time.time()
-    save_to_csv(courses, "khan_dataset.csv")
+    save_catalog(courses, "khan_dataset")
     print(f"\n⏱️  Fetching completed in {end_time - start_time:.2f} seconds.")
\ No newline at end of file
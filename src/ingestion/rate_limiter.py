@@ -0,0 +1,156 @@
+import asyncio
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional, Tuple
+
+from src.config import HTTP_RATE_INCREASE, HTTP_RATE_MAX_FACTOR
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Responses that mean "slow down": rate limited, overloaded or failing upstream
+THROTTLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Floor of one request a minute, the pause the fetchers used to take after a 429
+MIN_RATE = 1 / 60
+# Multiplicative decrease applied once per congestion event
+RATE_DECREASE = 0.5
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta seconds or an HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HostRateLimiter:
+    """Token bucket for one host whose rate adapts to the server's responses (AIMD).
+
+    Every reservation gets a ticket, its position in the host's request order.
+    The rate grows by a fixed step, up to max_rate, once per window: when a
+    healthy response comes back for a request sent after the last change. A 429
+    or 5xx halves it once per congestion event; throttles of requests sent
+    before the cut are ignored. A Retry-After header pauses the host until it
+    expires. Callers reserve a token and sleep outside the lock, so threads and
+    coroutines sharing a host queue up in order; a cut or pause sends callers
+    still sleeping on an earlier reservation back to the queue at the new pace.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        max_rate: Optional[float] = None,
+        burst: float = 1.0,
+        increase: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate
+        self.max_rate = max_rate or rate * HTTP_RATE_MAX_FACTOR
+        self.min_rate = min(MIN_RATE, rate)
+        self.burst = burst
+        self.increase = increase if increase is not None else rate * HTTP_RATE_INCREASE
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = burst
+        # Time the bucket was last refilled; in the future while a Retry-After pause runs
+        self._updated = clock()
+        # Last ticket handed out, and the last one issued before each kind of change
+        self._issued = 0
+        self._cut_seq = 0
+        self._window_seq = 0
+        self._rescheduled_seq = 0
+
+    def reserve(self) -> Tuple[int, float]:
+        """Take a token; returns its ticket and how long to wait before using it."""
+        with self._lock:
+            now = self._clock()
+            if now > self._updated:
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+            self._tokens -= 1
+            self._issued += 1
+            return self._issued, (self._updated - now) + max(0.0, -self._tokens) / self.rate
+
+    def _rescheduled(self, ticket: int) -> bool:
+        with self._lock:
+            return ticket <= self._rescheduled_seq
+
+    def acquire(self) -> int:
+        """Wait for a token; returns the ticket to pass to record()."""
+        while True:
+            ticket, wait = self.reserve()
+            if wait <= 0:
+                return ticket
+            time.sleep(wait)
+            if not self._rescheduled(ticket):
+                return ticket
+
+    async def acquire_async(self) -> int:
+        while True:
+            ticket, wait = self.reserve()
+            if wait <= 0:
+                return ticket
+            await asyncio.sleep(wait)
+            if not self._rescheduled(ticket):
+                return ticket
+
+    def record(
+        self,
+        status: Optional[int],
+        retry_after: Optional[float] = None,
+        ticket: Optional[int] = None,
+    ) -> None:
+        """Adapt to one response; status None means the request itself failed.
+
+        ticket is the one acquire() returned for the request; without it the
+        response counts as sent after every earlier change.
+        """
+        with self._lock:
+            if status is not None and status not in THROTTLE_STATUSES:
+                if ticket is None or ticket > self._window_seq:
+                    self.rate = min(self.max_rate, self.rate + self.increase)
+                    self._window_seq = self._issued
+                return
+
+            now = self._clock()
+            cut = ticket is None or ticket > self._cut_seq
+            if cut:
+                self.rate = max(self.min_rate, self.rate * RATE_DECREASE)
+                self._cut_seq = self._window_seq = self._issued
+            pause_until = now + retry_after if retry_after else None
+            paused = pause_until is not None and pause_until > self._updated
+            if not (cut or paused):
+                return
+
+            # Waits handed out so far assumed the old rate; their holders queue again
+            self._rescheduled_seq = self._issued
+            self._tokens = 0.0
+            self._updated = max(self._updated, now)
+            if paused:
+                # Nothing refills before the server's deadline; the next request goes right at it
+                self._updated = pause_until
+                self._tokens = 1.0
+
+
+# One limiter per host, shared by every client in the process
+_limiters: Dict[str, HostRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_host_limiter(host: str, rate: float) -> HostRateLimiter:
+    """Shared limiter of a host; the first caller's rate sets its starting point."""
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            limiter = _limiters[host] = HostRateLimiter(rate)
+        return limiter
@@ -0,0 +1,39 @@
+from src.engine import bulk_embedding
+from src.engine.bulk_embedding import (
+    MIN_BATCH_SIZE,
+    WORKER_MEMORY_BYTES,
+    BulkEmbedder,
+    default_workers,
+    tune_batch_size,
+)
+
+GIB = 1024**3
+
+
+def test_default_workers_fit_model_copies_in_memory(monkeypatch):
+    monkeypatch.setattr(bulk_embedding.os, "cpu_count", lambda: 64)
+    monkeypatch.setattr(bulk_embedding, "available_memory", lambda: 8 * WORKER_MEMORY_BYTES)
+    assert default_workers() == 4
+
+    monkeypatch.setattr(bulk_embedding, "available_memory", lambda: None)
+    assert default_workers() == 32
+
+    monkeypatch.setattr(bulk_embedding, "available_memory", lambda: WORKER_MEMORY_BYTES // 2)
+    assert default_workers() == 1
+
+
+def test_batch_budget_leaves_room_for_worker_models(monkeypatch):
+    monkeypatch.setattr(bulk_embedding, "available_memory", lambda: 2 * GIB)
+    unreserved = tune_batch_size(1e6, 384, 1000)
+    reserved = tune_batch_size(1e6, 384, 1000, reserved_bytes=GIB)
+    assert reserved < unreserved
+    assert abs(reserved - unreserved // 2) <= 1
+    assert tune_batch_size(1e6, 384, 1000, reserved_bytes=4 * GIB) == MIN_BATCH_SIZE
+
+
+def test_only_unstarted_pool_reserves_memory():
+    embedder = BulkEmbedder(embedding_model=None, workers=3)
+    assert embedder.pending_worker_memory == 3 * WORKER_MEMORY_BYTES
+    assert BulkEmbedder(embedding_model=None, workers=1).pending_worker_memory == 0
+    embedder._executor = object()
+    assert embedder.pending_worker_memory == 0
@@ -0,0 +1,84 @@
+import pytest
+
+import src.ingestion.crawl_checkpoint as crawl_checkpoint
+from src.ingestion.crawl_checkpoint import CrawlCheckpoint, crawl_session
+
+
+class FakeClient:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def checkpoint_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "checkpoints.sqlite")
+    monkeypatch.setattr(crawl_checkpoint, "CRAWL_CHECKPOINT_PATH", path)
+    return path
+
+
+def crawl_two_pages(client=None, checkpoint=None, fail=False, raise_error=False, clients=None):
+    clients = [] if clients is None else clients
+
+    def new_client():
+        clients.append(FakeClient())
+        return clients[-1]
+
+    with crawl_session(client, checkpoint, "source", "p", new_client=new_client) as session:
+        session.resume()
+        session.save_page([{"id": 1}], 2)
+        if raise_error:
+            raise RuntimeError("connection reset")
+        session.save_page([{"id": 2}], 3)
+        session.failed = fail
+    return session, clients
+
+
+def resume(path):
+    checkpoint = CrawlCheckpoint(path, "source", "p")
+    try:
+        return checkpoint.resume()
+    finally:
+        checkpoint.close()
+
+
+def test_finished_crawl_starts_over(checkpoint_path):
+    session, clients = crawl_two_pages()
+    assert clients[0].closed
+    with pytest.raises(Exception):
+        # The session's own checkpoint is closed on exit
+        session.checkpoint.resume()
+    assert resume(checkpoint_path) == (None, 0, [])
+
+
+def test_failed_crawl_resumes(checkpoint_path):
+    crawl_two_pages(fail=True)
+    assert resume(checkpoint_path) == ("3", 2, [{"id": 1}, {"id": 2}])
+
+
+def test_exception_keeps_checkpoint_and_closes_client(checkpoint_path):
+    clients = []
+    with pytest.raises(RuntimeError):
+        crawl_two_pages(raise_error=True, clients=clients)
+    assert clients[0].closed
+    assert resume(checkpoint_path) == ("2", 1, [{"id": 1}])
+
+
+def test_caller_client_and_checkpoint_stay_open(checkpoint_path):
+    client = FakeClient()
+    checkpoint = CrawlCheckpoint(checkpoint_path, "source", "p")
+    checkpoint.resume()
+    session, clients = crawl_two_pages(client=client, checkpoint=checkpoint)
+    assert session.client is client and not client.closed and not clients
+    # Still open: finished, so the next resume starts over
+    assert checkpoint.resume() == (None, 0, [])
+    checkpoint.close()
+
+
+def test_without_checkpoint_path(monkeypatch):
+    monkeypatch.setattr(crawl_checkpoint, "CRAWL_CHECKPOINT_PATH", "")
+    session, clients = crawl_two_pages()
+    assert session.checkpoint is None and clients[0].closed
+    assert session.resume() == (None, 0, [])
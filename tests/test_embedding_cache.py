@@ -0,0 +1,20 @@
+from src.engine.embedding_cache import SQLiteEmbeddingStore, normalize_term
+
+
+def test_normalize_term_keeps_case_and_collapses_whitespace():
+    assert normalize_term("  Machine   Learning\n") == "Machine Learning"
+    assert normalize_term("SQL") != normalize_term("sql")
+
+
+def test_store_round_trip_and_retain(tmp_path):
+    store = SQLiteEmbeddingStore(tmp_path / "cache.sqlite")
+    try:
+        store.put_many({"m:a": [1.0, 2.0], "m:b": [3.0, 4.0], "old:a": [5.0, 6.0]})
+        assert store.get_many(["m:a", "missing"]) == {"m:a": [1.0, 2.0]}
+
+        assert store.retain({"m:a", "m:c"}) == 2
+        assert len(store) == 1
+        assert store.get_many(["m:a", "m:b", "old:a"]) == {"m:a": [1.0, 2.0]}
+        assert store.retain(["m:a"]) == 0
+    finally:
+        store.close()
@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+from langchain_chroma import Chroma
+from langchain_core.embeddings import Embeddings
+
+from src.engine.flat_index import FlatIndex, export_flat_index, read_flat_index_version
+
+DIM = 16
+COUNT = 300
+
+
+class NoEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        raise AssertionError("vectors are passed in directly")
+
+    def embed_query(self, text):
+        raise AssertionError("vectors are passed in directly")
+
+
+@pytest.fixture(scope="module")
+def collection(tmp_path_factory):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(COUNT, DIM)).astype(np.float32)
+    db = Chroma(
+        collection_name="courses",
+        embedding_function=NoEmbeddings(),
+        persist_directory=str(tmp_path_factory.mktemp("chroma")),
+    )
+    ids = [f"course-{i}" for i in range(COUNT)]
+    metadatas = [
+        {"id": doc_id, "source": ["Coursera", "Khan Academy"][i % 2], "is_free": i % 3 == 0, "rank": i}
+        for i, doc_id in enumerate(ids)
+    ]
+    db._collection.add(
+        ids=ids, embeddings=vectors.tolist(), metadatas=metadatas, documents=["text"] * COUNT
+    )
+    return db, vectors, rng.normal(size=(5, DIM)).astype(np.float32)
+
+
+def chroma_query(db, queries, k, where=None):
+    found = db._collection.query(
+        query_embeddings=queries.tolist(), n_results=k, where=where, include=["distances"]
+    )
+    return found["ids"], found["distances"]
+
+
+@pytest.mark.parametrize(
+    "where",
+    [None, {"is_free": True}, {"$and": [{"source": "Coursera"}, {"rank": {"$gte": 100}}]}],
+)
+def test_flat_index_matches_chroma(collection, tmp_path, where):
+    db, _, queries = collection
+    assert export_flat_index(db, tmp_path / "flat", "v1") == COUNT
+    assert read_flat_index_version(tmp_path / "flat") == "v1"
+
+    index = FlatIndex(tmp_path / "flat")
+    results = index.query(queries, 10, where)
+    expected_ids, expected_distances = chroma_query(db, queries, 10, where)
+    for hits, ids, distances in zip(results, expected_ids, expected_distances):
+        assert [doc.id for doc, _ in hits] == ids
+        assert np.allclose([d for _, d in hits], distances, rtol=1e-4, atol=1e-4)
+
+
+def test_flat_index_documents_carry_metadata_only(collection, tmp_path):
+    db, vectors, _ = collection
+    export_flat_index(db, tmp_path / "flat", "v1")
+    index = FlatIndex(tmp_path / "flat")
+
+    found = index.get(["course-7", "missing"])
+    assert list(found) == ["course-7"]
+    doc, vector = found["course-7"]
+    assert doc.page_content == ""
+    assert doc.metadata == {"id": "course-7", "source": "Khan Academy", "is_free": False, "rank": 7}
+    assert np.array_equal(vector, vectors[7])
+
+
+def test_empty_collection_exports(tmp_path):
+    db = Chroma(
+        collection_name="empty",
+        embedding_function=NoEmbeddings(),
+        persist_directory=str(tmp_path / "chroma"),
+    )
+    assert export_flat_index(db, tmp_path / "flat", "v0", dtype="int8") == 0
+    assert FlatIndex(tmp_path / "flat").query([[0.0] * DIM], 5) == [[]]
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_compact_dtypes_keep_recall(collection, tmp_path, dtype):
+    db, vectors, queries = collection
+    export_flat_index(db, tmp_path / "full", "v1")
+    export_flat_index(db, tmp_path / "compact", "v1", dtype=dtype)
+    full = FlatIndex(tmp_path / "full")
+    compact = FlatIndex(tmp_path / "compact")
+    assert compact.embeddings is None
+
+    k = 10
+    expected = full.query(queries, k)
+    found = compact.query(queries, k)
+    hits = sum(
+        len({doc.id for doc, _ in want} & {doc.id for doc, _ in got})
+        for want, got in zip(expected, found)
+    )
+    assert hits / (k * len(queries)) >= 0.95
+    # Re-ranked distances come from the float32 rows
+    for doc, distance in found[0]:
+        row = int(doc.id.split("-")[1])
+        assert distance == pytest.approx(float(np.sum((vectors[row] - queries[0]) ** 2)), rel=1e-5)
+    assert np.array_equal(compact.get(["course-3"])["course-3"][1], vectors[3])
@@ -0,0 +1,68 @@
+import json
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from src.engine.history_compaction import (
+    MAX_PRIOR_SKILLS,
+    compact_history,
+    update_conversation_state,
+)
+
+
+def make_turns(n):
+    messages = []
+    for turn in range(n):
+        messages.append(HumanMessage(content=f"question {turn}"))
+        messages.append(AIMessage(content=f"answer {turn}"))
+    return messages
+
+
+def test_state_keeps_latest_values_and_newest_skills_first():
+    state = update_conversation_state({}, {
+        "current_role": "Analyst",
+        "detected_language": "th",
+        "preference_free": True,
+        "missing_skills": [{"display_name": "SQL"}, {"search_term_en": "Python"}],
+    })
+    state = update_conversation_state(state, {
+        "current_role": "",
+        "target_role": "Data Engineer",
+        "missing_skills": [{"display_name": "Spark"}, {"display_name": "SQL"}, "noise"],
+    })
+    assert state == {
+        "current_role": "Analyst",
+        "target_role": "Data Engineer",
+        "language": "TH",
+        "preference_free": True,
+        "prior_missing_skills": ["Spark", "SQL", "Python"],
+    }
+
+
+def test_state_does_not_mutate_input_and_caps_skills():
+    state = {"prior_missing_skills": ["Old"]}
+    skills = [{"display_name": f"Skill {i}"} for i in range(MAX_PRIOR_SKILLS + 5)]
+    new_state = update_conversation_state(state, {"missing_skills": skills})
+    assert state == {"prior_missing_skills": ["Old"]}
+    assert len(new_state["prior_missing_skills"]) == MAX_PRIOR_SKILLS
+    assert new_state["prior_missing_skills"][0] == "Skill 0"
+
+
+def test_short_history_is_sent_verbatim():
+    messages = make_turns(3)
+    assert compact_history(messages, {"target_role": "Dev"}, keep_turns=3) == messages
+    assert compact_history(make_turns(10), {"target_role": "Dev"}, keep_turns=0) == make_turns(10)
+
+
+def test_older_turns_are_replaced_by_state():
+    messages = make_turns(5)
+    state = {"target_role": "วิศวกรข้อมูล"}
+    compacted = compact_history(messages, state, keep_turns=2)
+    assert len(compacted) == 5
+    assert isinstance(compacted[0], SystemMessage)
+    assert json.dumps(state, ensure_ascii=False) in compacted[0].content
+    assert compacted[1:] == messages[-4:]
+
+
+def test_empty_state_only_trims():
+    messages = make_turns(5)
+    assert compact_history(messages, {}, keep_turns=1) == messages[-2:]
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import src.ingestion.crawl_checkpoint as crawl_checkpoint
+from src.ingestion.coursera_fetch import fetch_courses
+from src.ingestion.http_client import AsyncHttpClient, HttpClient
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Keep-alive JSON endpoint that records which connection served each request."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        server.connections.add(self.client_address)
+        server.paths.append(self.path)
+        status, headers, body = server.responses.pop(0) if server.responses else (200, {}, None)
+        payload = json.dumps(body if body is not None else {"path": self.path}).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.connections = set()
+    server.paths = []
+    server.responses = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_requests_reuse_one_connection(stub):
+    server, base = stub
+    with HttpClient(rate=0) as client:
+        for page in range(5):
+            response = client.get(f"{base}/items", params={"page": page})
+            assert response.status_code == 200
+            assert response.json() == {"path": f"/items?page={page}"}
+    assert len(server.connections) == 1
+
+
+def test_impersonated_session_reuses_connection(stub):
+    server, base = stub
+    with HttpClient(impersonate="chrome", rate=0) as client:
+        for _ in range(3):
+            assert client.get(f"{base}/items").status_code == 200
+    assert len(server.connections) == 1
+
+
+def test_throttled_request_is_retried(stub):
+    server, base = stub
+    server.responses = [(429, {"Retry-After": "0"}, {}), (503, {}, {}), (200, {}, {"ok": True})]
+    with HttpClient(rate=1000.0, retries=3) as client:
+        response = client.get(f"{base}/throttled")
+    assert response.json() == {"ok": True}
+    assert server.paths == ["/throttled"] * 3
+
+
+def test_retries_give_up_with_last_response(stub):
+    server, base = stub
+    server.responses = [(503, {}, {})] * 3
+    with HttpClient(rate=1000.0, retries=1) as client:
+        assert client.get(f"{base}/down").status_code == 503
+    assert len(server.paths) == 2
+
+
+def test_async_client_shares_pooled_connections(stub):
+    server, base = stub
+
+    async def fetch_all():
+        async with AsyncHttpClient(pool_size=2, rate=0) as client:
+            responses = await asyncio.gather(
+                *(client.get(f"{base}/items", params={"page": page}) for page in range(8))
+            )
+        return [response.json()["path"] for response in responses]
+
+    paths = asyncio.run(fetch_all())
+    assert paths == [f"/items?page={page}" for page in range(8)]
+    assert len(server.connections) <= 2
+
+
+def test_coursera_crawl_uses_one_connection(stub, monkeypatch):
+    server, base = stub
+    monkeypatch.setenv("URL_COURSERA_API", f"{base}/courses")
+    monkeypatch.setattr(crawl_checkpoint, "CRAWL_CHECKPOINT_PATH", "")
+    text = "An introduction to programming with Python for data analysis"
+    server.responses = [
+        (200, {}, {
+            "elements": [{"id": f"c{start}", "name": "Python", "description": text,
+                          "slug": f"s{start}", "primaryLanguages": ["en"]}],
+            "paging": {"next": str(start + 1)},
+        })
+        for start in range(3)
+    ] + [(200, {}, {"elements": []})]
+
+    with HttpClient(rate=0) as client:
+        courses = fetch_courses(limit_per_page=1, max_pages=10, client=client)
+    assert [course["id"] for course in courses] == ["c0", "c1", "c2"]
+    assert len(server.paths) == 4 and len(server.connections) == 1
@@ -0,0 +1,61 @@
+from src.engine.index_manifest import IndexManifest, load_existing_entries
+
+
+class FakeCollection:
+    def __init__(self, metadatas):
+        self.metadatas = metadatas
+        self.scans = 0
+
+    def count(self):
+        return len(self.metadatas)
+
+    def get(self, include, limit, offset):
+        assert include == ["metadatas"]
+        if offset == 0:
+            self.scans += 1
+        ids = sorted(self.metadatas)[offset : offset + limit]
+        return {"ids": ids, "metadatas": [self.metadatas[i] for i in ids]}
+
+
+class FakeDB:
+    def __init__(self, metadatas):
+        self._collection = FakeCollection(metadatas)
+
+
+def make_db():
+    return FakeDB({
+        "a": {"content_hash": "h1", "attributes_version": 2},
+        "b": {"content_hash": "h2"},
+    })
+
+
+def test_stale_manifest_is_rebuilt_from_a_scan(tmp_path):
+    db = make_db()
+    manifest = IndexManifest(tmp_path / "manifest.sqlite")
+    expected = {"a": ("h1", 2), "b": ("h2", None)}
+
+    assert load_existing_entries(db, manifest, "v1") == expected
+    assert db._collection.scans == 1
+    # Stamped with the version it mirrors, so the next run reads it directly
+    assert load_existing_entries(db, manifest, "v1") == expected
+    assert db._collection.scans == 1
+    # Another index version means the store changed behind the manifest's back
+    load_existing_entries(db, manifest, "v2")
+    assert db._collection.scans == 2
+    manifest.close()
+
+
+def test_writes_clear_the_stamp_until_marked_current(tmp_path):
+    db = make_db()
+    manifest = IndexManifest(tmp_path / "manifest.sqlite")
+    load_existing_entries(db, manifest, "v1")
+
+    manifest.upsert(["c"], [{"content_hash": "h3", "attributes_version": 2}])
+    manifest.delete(["a"])
+    assert manifest.index_version() is None
+    assert manifest.entries() == {"b": ("h2", None), "c": ("h3", 2)}
+
+    manifest.mark_current("v2")
+    assert manifest.is_current("v2", 2)
+    assert not manifest.is_current("v2", 3)
+    manifest.close()
@@ -0,0 +1,66 @@
+import pytest
+
+from src.engine.lexical_index import LexicalIndex, LexicalIndexStore, tokenize
+from src.engine.ranking import reciprocal_rank_fusion
+
+DOCS = {
+    "py-intro": "Python for Beginners Programming Learn Python basics",
+    "py-data": "Python for Data Analysis Data Science pandas and numpy",
+    "cpp": "C++ Fundamentals Programming pointers and memory",
+    "mkt": "Digital Marketing Marketing SEO and social media",
+    "th-mkt": "การตลาดดิจิทัล การตลาด เรียนรู้การตลาดออนไลน์",
+}
+
+
+def build_index(docs=DOCS):
+    from collections import Counter
+
+    return LexicalIndex(list(docs), [dict(Counter(tokenize(text))) for text in docs.values()])
+
+
+def test_tokenize_keeps_symbols_and_case_folds():
+    assert tokenize("C++ and C# with PYTHON") == ["c++", "and", "c#", "with", "python"]
+
+
+def test_search_ranks_by_bm25():
+    index = build_index()
+    hits = index.search("python data", 10)
+    assert [doc_id for doc_id, _ in hits] == ["py-data", "py-intro"]
+    assert hits[0][1] > hits[1][1] > 0
+
+
+def test_search_matches_symbol_terms_and_thai_text():
+    index = build_index()
+    assert [doc_id for doc_id, _ in index.search("c++", 5)] == ["cpp"]
+    assert [doc_id for doc_id, _ in index.search("การตลาด", 5)] == ["th-mkt"]
+
+
+def test_search_limits_and_misses():
+    index = build_index()
+    assert len(index.search("programming python marketing", 2)) == 2
+    assert index.search("kubernetes", 5) == []
+    assert index.search("python", 0) == []
+
+
+def test_store_applies_updates_deletes_and_rebuilds(tmp_path):
+    store = LexicalIndexStore(tmp_path / "lexical.sqlite")
+    try:
+        store.update(DOCS, [])
+        assert len(store) == len(DOCS)
+        store.update({"mkt": "Excel Spreadsheets"}, ["cpp"])
+        index = store.load()
+        assert [doc_id for doc_id, _ in index.search("excel", 5)] == ["mkt"]
+        assert index.search("pointers", 5) == []
+
+        store.update({"only": "Rust"}, [], rebuild=True)
+        assert store.load().doc_ids == ["only"]
+    finally:
+        store.close()
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60)
+    assert fused["b"] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused["a"] == pytest.approx(1 / 61)
+    assert max(fused, key=fused.get) == "b"
+    assert set(fused) == {"a", "b", "c", "d"}
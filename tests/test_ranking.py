@@ -0,0 +1,82 @@
+import random
+
+from langchain_core.documents import Document
+
+from src.engine.course_attributes import BUCKET_FREE, BUCKET_OTHER, BUCKET_THAI, bucket_of
+from src.engine.ranking import rank_candidates
+
+SOURCES = ["Khan Academy", "SkillLane", "FutureSkill", "Coursera", "Udemy"]
+
+
+def course(url, source="Coursera"):
+    return Document(page_content="", metadata={"url": url, "title": url, "source": source})
+
+
+def urls(picks):
+    return [[(doc.metadata["url"], score) for doc, score in skill] for skill in picks]
+
+
+def select_reference(results, user_lang, prefer_free, k=2, threshold=20.0):
+    """The list-based per-skill selection that rank_candidates replaced."""
+    unique = {}
+    for doc, score in results:
+        url = doc.metadata.get("url")
+        if url not in unique or score < unique[url][1]:
+            unique[url] = (doc, score)
+    buckets = {BUCKET_FREE: [], BUCKET_THAI: [], BUCKET_OTHER: []}
+    for doc, score in unique.values():
+        if score <= threshold:
+            buckets[bucket_of(doc.metadata)].append((doc, score))
+    for entries in buckets.values():
+        entries.sort(key=lambda entry: entry[1])
+
+    if prefer_free:
+        primary = buckets[BUCKET_FREE]
+        fill = buckets[BUCKET_THAI if user_lang == "TH" else BUCKET_OTHER]
+    elif user_lang == "TH":
+        primary = buckets[BUCKET_THAI]
+        fill = sorted(buckets[BUCKET_OTHER] + buckets[BUCKET_FREE], key=lambda e: e[1])
+    else:
+        primary = buckets[BUCKET_OTHER]
+        fill = sorted(buckets[BUCKET_FREE] + buckets[BUCKET_THAI], key=lambda e: e[1])
+    return (primary + fill[: max(0, k - len(primary))])[:k]
+
+
+def test_matches_reference_selection():
+    rng = random.Random(7)
+    for _ in range(500):
+        per_skill = [
+            [
+                (course(f"u{rng.randint(0, 6)}", rng.choice(SOURCES)), float(rng.choice([10, 21, 25, 30])))
+                for _ in range(rng.randint(0, 10))
+            ]
+            for _ in range(rng.randint(1, 4))
+        ]
+        user_lang = rng.choice(["TH", "EN"])
+        prefer_free = rng.random() < 0.5
+        expected = [select_reference(results, user_lang, prefer_free) for results in per_skill]
+        assert urls(rank_candidates(per_skill, user_lang, prefer_free)) == urls(expected)
+
+
+def test_dedupes_by_url_and_applies_threshold():
+    results = [(course("a"), 15.0), (course("b"), 12.0), (course("a"), 11.0), (course("c"), 25.0)]
+    picks = rank_candidates([results, []], "EN", False, k=3)
+    assert urls(picks) == [[("a", 11.0), ("b", 12.0)], []]
+
+
+def test_preferred_bucket_comes_first():
+    results = [
+        (course("coursera", "Coursera"), 5.0),
+        (course("khan", "Khan Academy"), 18.0),
+        (course("skilllane", "SkillLane"), 1.0),
+    ]
+    assert urls(rank_candidates([results], "EN", True)) == [[("khan", 18.0), ("coursera", 5.0)]]
+    assert urls(rank_candidates([results], "TH", False)) == [[("skilllane", 1.0), ("coursera", 5.0)]]
+    # prefer_free with Thai fills up from Thai courses only
+    assert urls(rank_candidates([results], "TH", True)) == [[("khan", 18.0), ("skilllane", 1.0)]]
+
+
+def test_by_position_keeps_fused_order():
+    results = [(course("b"), 0.0), (course("a"), 0.0), (course("b"), 0.0), (course("c"), 0.0)]
+    picks = rank_candidates([results], "EN", False, k=3, by_position=True)
+    assert [doc.metadata["url"] for doc, _ in picks[0]] == ["b", "a", "c"]
@@ -0,0 +1,98 @@
+from email.utils import formatdate
+
+import pytest
+
+import src.ingestion.rate_limiter as rate_limiter
+from src.ingestion.rate_limiter import HostRateLimiter, parse_retry_after
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_limiter(rate=2.0):
+    clock = FakeClock()
+    return HostRateLimiter(rate, max_rate=8.0, increase=1.0, clock=clock), clock
+
+
+def test_token_bucket_spaces_requests():
+    limiter, clock = make_limiter()
+    assert limiter.reserve() == (1, 0.0)
+    assert limiter.reserve() == (2, pytest.approx(0.5))
+    clock.now += 1.0
+    assert limiter.reserve() == (3, pytest.approx(0.0))
+
+
+def test_one_decrease_per_congestion_event():
+    limiter, _ = make_limiter()
+    tickets = [limiter.reserve()[0] for _ in range(3)]
+    for ticket in tickets:
+        limiter.record(503, ticket=ticket)
+    assert limiter.rate == pytest.approx(1.0)
+
+    # A request sent after the cut counts as a new event
+    limiter.record(429, ticket=limiter.reserve()[0])
+    assert limiter.rate == pytest.approx(0.5)
+
+
+def test_one_increase_per_window():
+    limiter, _ = make_limiter()
+    tickets = [limiter.reserve()[0] for _ in range(3)]
+    for ticket in tickets:
+        limiter.record(200, ticket=ticket)
+    assert limiter.rate == pytest.approx(3.0)
+
+    limiter.record(200, ticket=limiter.reserve()[0])
+    assert limiter.rate == pytest.approx(4.0)
+    for _ in range(10):
+        limiter.record(200)
+    assert limiter.rate == pytest.approx(8.0)
+
+
+def test_rate_floor():
+    limiter, _ = make_limiter()
+    for _ in range(20):
+        limiter.record(None)
+    assert limiter.rate == pytest.approx(rate_limiter.MIN_RATE)
+
+
+def test_retry_after_pauses_host():
+    limiter, _ = make_limiter()
+    limiter.reserve()
+    limiter.record(429, retry_after=10.0)
+    ticket, wait = limiter.reserve()
+    assert wait == pytest.approx(10.0)
+    # The request at the deadline is not delayed further by the halved rate
+    assert limiter.reserve()[1] == pytest.approx(10.0 + 1 / limiter.rate)
+
+
+def test_cut_reschedules_sleeping_callers(monkeypatch):
+    limiter, clock = make_limiter()
+    limiter.reserve()
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        clock.now += seconds
+        if len(sleeps) == 1:
+            # Another request is throttled just as this one wakes up
+            limiter.record(429, ticket=1)
+
+    monkeypatch.setattr(rate_limiter.time, "sleep", sleep)
+    ticket = limiter.acquire()
+    assert ticket == 3
+    # The first wait assumed the old rate; the second one follows the halved rate
+    assert sleeps == [pytest.approx(0.5), pytest.approx(1.0)]
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("5") == 5.0
+    assert parse_retry_after(" 0.5 ") == 0.5
+    assert parse_retry_after("-3") == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(formatdate(usegmt=True)) == pytest.approx(0.0, abs=2.0)
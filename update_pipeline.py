@@ -1,63 +1,89 @@
-import sys
-import pandas as pd
-from src.config import DATA_DIR
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+from src.config import DATA_DIR, PIPELINE_CONCURRENT
 from src.ingestion.coursera_fetch import fetch_courses
 from src.ingestion.futureskills_fetch import fetch_futureskill
 from src.ingestion.datacamp_fetch import fetch_datacamp_courses
+from src.ingestion.khan_fetch import fetch_khan_academy
+from src.engine.catalog_store import save_catalog
 from src.engine.vector_manager import build_database
 from src.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
-def save_to_data_folder(data_list, filename):
-    if not data_list:
-        logger.warning(f"No data to save for {filename}")
-        return
+# (stage name, fetcher, catalog name); each source is a different host with its own pacing
+FETCH_STAGES: List[Tuple[str, Callable[[], List[Dict[str, Any]]], str]] = [
+    ("Coursera", lambda: fetch_courses(max_pages=170, start_page_num=1), "coursera_dataset"),
+    ("FutureSkill", lambda: fetch_futureskill(limit_pages=100), "futureskill_dataset"),
+    ("DataCamp", lambda: fetch_datacamp_courses(max_pages=25), "datacamp_dataset"),
+    ("Khan Academy", lambda: fetch_khan_academy(limit_courses=2000, max_workers=20), "khan_dataset"),
+]
 
-    full_path = DATA_DIR / filename
-    
-    # Ensure directory exists
-    DATA_DIR.mkdir(exist_ok=True, parents=True)
+def run_fetch_stage(name: str, fetch: Callable[[], List[Dict[str, Any]]], dataset: str) -> Dict[str, Any]:
+    """Fetch and save one source; errors are logged and reported, never raised."""
+    logger.info(f"Fetching {name} Data...")
+    started = time.perf_counter()
+    records: List[Dict[str, Any]] = []
+    status = "ok"
+    try:
+        records = fetch()
+        save_catalog(records, dataset, DATA_DIR)
+        if not records:
+            status = "empty"
+    except Exception as e:
+        logger.error(f"Error fetching {name}: {e}")
+        status = "failed"
+    seconds = time.perf_counter() - started
+    logger.info(f"{name} finished in {seconds:.1f}s ({len(records)} records, {status})")
+    return {"stage": name, "seconds": seconds, "records": len(records), "status": status}
 
-    df = pd.DataFrame(data_list)
-    df.to_csv(full_path, index=False, encoding='utf-8-sig')
-    logger.info(f"Saved {len(df)} records to: {full_path}")
+def log_timings(timings: List[Dict[str, Any]], total: float) -> None:
+    logger.info("Stage timings:")
+    for t in timings:
+        records = f"{t['records']:>6} records" if t["records"] is not None else " " * 14
+        logger.info(f"   {t['stage']:<16} {t['seconds']:>8.1f}s  {records}  {t['status']}")
+    logger.info(f"   {'Total':<16} {total:>8.1f}s")
 
-def run_pipeline():
+def run_pipeline(concurrent: bool = PIPELINE_CONCURRENT):
     logger.info("="*50)
     logger.info("STARTING UPDATE PIPELINES")
     logger.info("="*50)
+    started = time.perf_counter()
 
-    logger.info("[1/5] Fetching Coursera Data...")
-    try:
-        coursera_data = fetch_courses(max_pages=170, start_page_num=1)
-        save_to_data_folder(coursera_data, "coursera_dataset.csv")
-    except Exception as e:
-        logger.error(f"Error fetching Coursera: {e}")
+    step = f"[1/2] Fetching {len(FETCH_STAGES)} sources"
+    if concurrent:
+        # Wall-clock time is the slowest crawl rather than the sum of all of them
+        logger.info(f"{step} concurrently...")
+        with ThreadPoolExecutor(max_workers=len(FETCH_STAGES), thread_name_prefix="fetch") as executor:
+            timings = list(executor.map(lambda stage: run_fetch_stage(*stage), FETCH_STAGES))
+    else:
+        logger.info(f"{step} sequentially...")
+        timings = [run_fetch_stage(*stage) for stage in FETCH_STAGES]
 
-    logger.info("[2/5] Fetching FutureSkill Data...")
-    try:
-        futureskill_data = fetch_futureskill(limit_pages=100)
-        save_to_data_folder(futureskill_data, "futureskill_dataset.csv")
-    except Exception as e:
-        logger.error(f"Error fetching FutureSkill: {e}")
-        
-    logger.info("[3/5] Fetching DataCamp Data...")
-    try:
-        datacamp_data = fetch_datacamp_courses(max_limit=1000)
-        save_to_data_folder(datacamp_data, "datacamp_dataset.csv")
-    except Exception as e:
-        logger.error(f"Error fetching DataCamp: {e}")
-        
-    logger.info("[4/5] Rebuilding Vector Database...")
+    logger.info("[2/2] Rebuilding Vector Database...")
+    rebuild_started = time.perf_counter()
+    status = "ok"
     try:
         build_database()
     except Exception as e:
         logger.error(f"Error building database: {e}")
+        status = "failed"
+    timings.append({
+        "stage": "Vector DB",
+        "seconds": time.perf_counter() - rebuild_started,
+        "records": None,
+        "status": status,
+    })
 
     logger.info("="*50)
     logger.info("PIPELINE COMPLETED")
+    log_timings(timings, time.perf_counter() - started)
     logger.info("="*50)
 
 if __name__ == "__main__":
-    run_pipeline()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Fetch all course sources and update the vector store.")
+    parser.add_argument("--sequential", action="store_true", help="crawl one source at a time")
+    args = parser.parse_args()
+    run_pipeline(concurrent=PIPELINE_CONCURRENT and not args.sequential)